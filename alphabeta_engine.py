@@ -5,24 +5,30 @@ from formatter import *
 
 
 class AlphaBetaEngine(OthelloEngine):
-    def __init__(self, path, level=5, threads=2):
-        super().__init__(path, level, threads)
+    def __init__(self, path, level=5, threads=2, cache_size=1000000, endgame_empties=6, position_table=None):
+        super().__init__(path, level, threads, endgame_empties, position_table)
         self.game = Othello()
+        self.cache_size = cache_size
+        self.move_cache = {}  # board format -> sorted engine moves, only used by search_best_move
+        self.move_cache_hits = 0
+        self.move_cache_lookups = 0
 
-    def get_best_move(self, input_moves, max_width=3, max_depth=3, logger_func=None):
+    def get_best_move(self, input_moves, max_width=3, max_depth=3, logger_func=None, trace=None):
         """
         Get the best move given the previous moves.
         Use Alpha-Beta pruning algorithm to search the game tree.
+        The trace is written as text through `logger_func`, or to `trace` (e.g. a `TokenTrace`) if given.
         """
 
         if not logger_func:
             logger_func = print
+        if trace is None:
+            trace = TextTrace(logger_func)
 
         assert max_width in list(range(1, 11)) and max_depth in list(range(1, 11)), "Invalid max_width or max_depth"
 
         TRACK_MOVES_PROB = 0.0
         track_moves = random.random() < TRACK_MOVES_PROB
-        tarch_move_flag = "TRACK_ENABLE\n" if track_moves else ""
 
         self.game.play_from_start(input_moves)
         root_node_color = self.game.current_player
@@ -31,25 +37,19 @@ class AlphaBetaEngine(OthelloEngine):
         possible_moves = sort_positions(possible_moves, ascending=False)
         pruned_possible_moves = possible_moves[:max_width]  # [(move, score), ...]
 
-        logger_func(
-            f"<input>\n{format_board(self.game.board)}\n{format_color(self.game.current_player)}\n{format_args(max_width, max_depth)}\n{tarch_move_flag}</input>\n"
-        )
-        logger_func("<reasoning>")
-        logger_func(f"Possible moves and score:{format_possible_moves(possible_moves)}")
+        trace.input(self.game.board, self.game.current_player, max_width, max_depth, track_moves)
+        trace.reasoning()
+        trace.possible_moves(possible_moves)
 
         if not pruned_possible_moves:  # input is an end game state
-            logger_func("[No possible moves]")
-            logger_func("> Playing ps ")
-            logger_func("</reasoning>\n")
-            logger_func(f"<output>\n ps \n{format_board(self.game.board)}\n</output>\n")
+            trace.line("[No possible moves]")
+            trace.play("ps", self.game.board)
             return None
 
         if max_depth == 1 or max_width == 1:
             move, score = pruned_possible_moves[0]
-            logger_func(f"> Playing {move} ")
-            logger_func("</reasoning>\n")
             self.game.play_from_start(input_moves + move)
-            logger_func(f"<output>\n {move} \n{format_board(self.game.board)}\n</output>\n")
+            trace.play(move, self.game.board)
             return move
 
         move, score = pruned_possible_moves.pop(0)
@@ -65,7 +65,7 @@ class AlphaBetaEngine(OthelloEngine):
                 "beta": float("inf"),
             }
         ]
-        logger_func(format_stack(stack))
+        trace.stack(stack)
 
         total_evaluated_nodes = 0  # only for debugging
         while True:
@@ -73,7 +73,7 @@ class AlphaBetaEngine(OthelloEngine):
             node = stack[-1]
             prev_moves = input_moves + "".join([node["move"] for node in stack])
             self.game.play_from_start(prev_moves)
-            logger_func("\n=> Search next node")
+            trace.search_next_node()
 
             # get possible moves from Egaroucid
             possible_moves = self.get_moves(prev_moves)
@@ -90,23 +90,22 @@ class AlphaBetaEngine(OthelloEngine):
             color_is_normal = True if self.game.current_player == current_color_shoud_be else False
 
             if node["remaining_depth"] == 1:
-                logger_func("[Depth limit reached - evaluate all leaves]")
+                trace.line("[Depth limit reached - evaluate all leaves]")
             else:
-                logger_func("[Depth limit not reached]")
+                trace.line("[Depth limit not reached]")
                 if track_moves:
-                    logger_func(f"Previous moves:{format_input_moves(input_moves + ''.join([node['move'] for node in stack]))}")
-                logger_func(f"<board>\n{format_board(self.game.board)}\n</board>\n{format_color(current_color_shoud_be)}")
+                    trace.previous_moves(input_moves + "".join([node["move"] for node in stack]))
+                trace.board(self.game.board, current_color_shoud_be)
                 if color_is_normal:
-                    logger_func(f"Possible moves and score:{format_possible_moves(possible_moves)}")
+                    trace.possible_moves(possible_moves)
                 else:
-                    logger_func(f"Possible moves and score:")
-                    logger_func(f"Opponent possible moves and score:{format_possible_moves(possible_moves)}")
+                    trace.opponent_possible_moves(possible_moves)
                 if not pruned_possible_moves:
-                    logger_func("[Neither player has legal moves]")
+                    trace.line("[Neither player has legal moves]")
                 elif not color_is_normal:
-                    logger_func("[Only opponent has legal moves]")
+                    trace.line("[Only opponent has legal moves]")
                 else:
-                    logger_func("[Current player has legal moves]")
+                    trace.line("[Current player has legal moves]")
 
             if not pruned_possible_moves or node["remaining_depth"] == 1:  # leaf node, evaluate
 
@@ -121,7 +120,7 @@ class AlphaBetaEngine(OthelloEngine):
                     node["move"] = None
                     node["score"] = None
                 else:
-                    logger_func("[Leaf node - evaluate next]")
+                    trace.line("[Leaf node - evaluate next]")
                     if node["is_max"] and node["score"] > node["alpha"]:
                         node["best_move"] = node["move"]
                         node["alpha"] = node["score"]
@@ -134,6 +133,7 @@ class AlphaBetaEngine(OthelloEngine):
                         node["remaining_moves"] = []
                     if node["remaining_moves"]:
                         node["move"], node["score"] = node["remaining_moves"].pop(0)
+                node["dirty"] = True  # see StackFormatter
                 # logger_func(format_stack(stack))
                 # logger_func(format_node(node))
 
@@ -155,6 +155,7 @@ class AlphaBetaEngine(OthelloEngine):
                             parent_node["beta"] = son_node["alpha"]
                             parent_node["best_move"] = parent_node["move"]
                     # pruning
+                    parent_node["dirty"] = True
                     parent_node["move"] = None
                     parent_node["score"] = None
                     if parent_node["alpha"] >= parent_node["beta"]:
@@ -163,8 +164,8 @@ class AlphaBetaEngine(OthelloEngine):
                         parent_node["move"], parent_node["score"] = parent_node["remaining_moves"].pop(0)
                         break
 
-                logger_func("[Updated stack]")
-                logger_func(format_stack(stack))
+                trace.line("[Updated stack]")
+                trace.stack(stack)
 
                 for idx in range(len(stack) - 1, 0, -1):
                     if stack[idx]["move"] is not None:
@@ -174,16 +175,14 @@ class AlphaBetaEngine(OthelloEngine):
                 # logger_func(format_stack(stack))
 
                 if len(stack) == 1 and not stack[0]["move"]:
-                    logger_func("[End of search]")
-                    logger_func(f'> Playing {stack[0]["best_move"]} ')
-                    logger_func("</reasoning>\n")
+                    trace.line("[End of search]")
                     self.game.play_from_start(input_moves + stack[0]["best_move"])
-                    logger_func(f"<output>\n {stack[0]['best_move']} \n{format_board(self.game.board)}\n</output>\n")
+                    trace.play(stack[0]["best_move"], self.game.board)
                     # print(f'alpha-beta pruning evaluated {total_evaluated_nodes} nodes')
                     return stack[0]["best_move"]
 
             else:  # internal node, expand
-                logger_func("[Internal node - expand]")
+                trace.line("[Internal node - expand]")
                 move, score = pruned_possible_moves.pop(0)
                 if not color_is_normal:
                     stack.append(
@@ -211,7 +210,124 @@ class AlphaBetaEngine(OthelloEngine):
                             "beta": node["beta"],
                         }
                     )
-                logger_func(format_stack(stack))
+                trace.stack(stack)
+
+    def _get_sorted_moves(self):
+        """
+        Get the engine moves of the current game position, sorted the same way as in `get_best_move`.
+        Results are cached by board, so transpositions and repeated searches skip the engine.
+        """
+        key = self.game.get_board_format()
+        possible_moves = self.move_cache.get(key)
+        self.move_cache_lookups += 1
+        if possible_moves is None:
+            possible_moves = self.get_moves(self.game.get_moves())
+            possible_moves = [x for x in possible_moves if x[0] != "??"]
+            possible_moves = sort_positions(possible_moves, ascending=False)
+            if len(self.move_cache) >= self.cache_size:
+                self.move_cache.clear()
+            self.move_cache[key] = possible_moves
+        else:
+            self.move_cache_hits += 1
+        return possible_moves
+
+    def search_best_move(self, input_moves, max_width=3, max_depth=3, return_score=False):
+        """
+        Same search as `get_best_move`, without writing the trace.
+        The tree is walked recursively with push/pop on the board instead of replaying every node,
+        engine scores are cached and subtrees are shared through a transposition table.
+        Returns the same move as `get_best_move`, with return_score=True (move, score) where score is
+        the value of the root from the root player's view, the same as `trace_parser.trace_score` of the trace.
+        """
+
+        assert max_width in list(range(1, 11)) and max_depth in list(range(1, 11)), "Invalid max_width or max_depth"
+
+        self.game.play_from_start(input_moves)
+        root_node_color = self.game.current_player
+        pruned_possible_moves = self._get_sorted_moves()[:max_width]
+
+        if not pruned_possible_moves:  # input is an end game state
+            return (None, None) if return_score else None
+
+        if max_depth == 1 or max_width == 1:
+            return tuple(pruned_possible_moves[0]) if return_score else pruned_possible_moves[0][0]
+
+        transposition_table = {}
+        score, best_move = self._search(
+            pruned_possible_moves, max_depth, True, float("-inf"), float("inf"), max_width, root_node_color, transposition_table
+        )
+        return (best_move, score) if return_score else best_move
+
+    def _search(self, node_moves, remaining_depth, is_max, alpha, beta, max_width, root_node_color, transposition_table):
+        """
+        Search one stack node of `get_best_move`. `node_moves` are the (move, score) pairs of the node,
+        scores from the root player's view. Returns (alpha for max node / beta for min node, best move).
+        """
+        if remaining_depth == 1:  # evaluate all leaves
+            bound = alpha if is_max else beta
+            best_move, value = (max if is_max else min)([(None, bound)] + node_moves, key=lambda x: x[1])
+            return value, best_move
+
+        best_move = None
+        for move, score in node_moves:
+            if move != "ps":
+                self.game.push(move)
+
+            possible_moves = self._get_sorted_moves()
+            if not self.game.current_player == root_node_color:
+                possible_moves = [(m, -s) for m, s in possible_moves]
+            pruned_possible_moves = possible_moves[:max_width]
+
+            if not pruned_possible_moves:  # leaf node
+                value = score
+            elif (self.game.current_player == root_node_color) == is_max:  # the next player has to pass
+                value, _ = self._search(
+                    [("ps", score)], remaining_depth - 1, not is_max, alpha, beta, max_width, root_node_color, transposition_table
+                )
+            else:
+                key = (self.game.get_board_format(), remaining_depth - 1, not is_max, alpha, beta)
+                value = transposition_table.get(key)
+                if value is None:
+                    value, _ = self._search(
+                        pruned_possible_moves,
+                        remaining_depth - 1,
+                        not is_max,
+                        alpha,
+                        beta,
+                        max_width,
+                        root_node_color,
+                        transposition_table,
+                    )
+                    transposition_table[key] = value
+
+            if move != "ps":
+                self.game.pop()
+
+            if is_max and value > alpha:
+                best_move, alpha = move, value
+            elif not is_max and value < beta:
+                best_move, beta = move, value
+            if alpha >= beta:  # pruning
+                break
+
+        return (alpha if is_max else beta), best_move
+
+
+class AlphaBetaPlayer(AlphaBetaEngine):
+    """
+    Alpha-Beta player with a fixed search tree, for the arena.
+    Uses `search_best_move`, so no trace is written.
+    """
+
+    def __init__(
+        self, path, level=5, threads=2, max_width=3, max_depth=3, cache_size=1000000, endgame_empties=6, position_table=None
+    ):
+        super().__init__(path, level, threads, cache_size, endgame_empties, position_table)
+        self.max_width = max_width
+        self.max_depth = max_depth
+
+    def get_best_move(self, input_moves):
+        return self.search_best_move(input_moves, self.max_width, self.max_depth)
 
 
 if __name__ == "__main__":
@@ -225,5 +341,6 @@ if __name__ == "__main__":
     best_move = engine.get_best_move("d3c5")
 
     print(f"### Best move: {best_move}")
+    print(f"### Best move (no trace): {engine.search_best_move('d3c5')}")
 
     engine.cleanup()
@@ -103,20 +103,31 @@ class OthelloArena:
 if __name__ == "__main__":
 
     from rwkv_engine import RWKVEngine
+    from alphabeta_engine import AlphaBetaPlayer
     
     # model_path, vaersion = 'models/rwkv7_othello_26m_L10_D448', 'v7
     model_path, version = 'models/rwkv7_othello_26m_L10_D448_extended', 'v7_ee'
+    # "alphabeta": player2 runs the same search tree on Egaroucid without writing a trace, the reference for the model
+    PLAYER2 = "rwkv"
+    ENGINE_PATH = "Egaroucid_for_Console_7_5_1_Windows_SIMD\Egaroucid_for_Console_7_5_1_SIMD.exe"
+    ENGINE_LEVEL = 1
     
     player1 = RWKVEngine(model_path, print_output=True, max_depth=1, max_width=1, rwkv_version=version)
     
     player2_depth, player2_width = 2, 2
-    player2 = RWKVEngine(model_path, print_output=True, max_depth=player2_depth, max_width=player2_width, rwkv_version=version)
+    if PLAYER2 == "alphabeta":
+        player2 = AlphaBetaPlayer(ENGINE_PATH, level=ENGINE_LEVEL, threads=1, max_width=player2_width, max_depth=player2_depth)
+    else:
+        player2 = RWKVEngine(model_path, print_output=True, max_depth=player2_depth, max_width=player2_width, rwkv_version=version)
 
     arena = OthelloArena(player1, player2, "opening_mini.txt")
 
     statistics = arena.evaluate()
     print(statistics)
-    print(f'Player1 tokens:{player1.get_avg_tokens()} Player2 tokens:{player2.get_avg_tokens()}')
+    if PLAYER2 == "alphabeta":
+        print(f'Player1 tokens:{player1.get_avg_tokens()} Player2 engine calls:{player2.call_counts}')
+    else:
+        print(f'Player1 tokens:{player1.get_avg_tokens()} Player2 tokens:{player2.get_avg_tokens()}')
 
     try:
         player1.cleanup()
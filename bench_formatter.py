@@ -0,0 +1,104 @@
+import time
+from formatter import format_board, format_score, format_possible_moves, sort_positions
+from trace_parser import parse_jsonl
+
+
+# the implementations before the lookup tables, kept as reference for the benchmark
+
+
+def format_board_reference(board):
+    symbols = {0: "·", 1: "●", 2: "○"}
+    rows = []
+    for row in board:
+        row_str = " ".join(symbols[cell] for cell in row)
+        rows.append(row_str + " ")
+    return "\n".join(rows)
+
+
+def format_score_reference(score):
+    if score == float("inf"):
+        return "+in"
+    if score == float("-inf"):
+        return "-in"
+    score_int = int(score)
+    abs_score = abs(score_int)
+    if abs_score < 10:
+        return f"+0{abs_score}" if score_int >= 0 else f"-0{abs_score}"
+    else:
+        return f"+{score_int}" if score_int >= 0 else str(score_int)
+
+
+def format_possible_moves_reference(moves_list, sep=" "):
+    if not moves_list:
+        return ""
+
+    def position_to_value(pos):
+        col = ord(pos[0]) - ord("a")
+        row = int(pos[1])
+        return row * 10 + col
+
+    sorted_moves = sorted(moves_list, key=lambda x: position_to_value(x[0]))
+    formatted_lines = []
+    for pos, score in sorted_moves:
+        formatted_lines.append(f"{pos:2s} {format_score_reference(score)}")
+    return " " + sep.join(formatted_lines)
+
+
+def sort_positions_reference(positions, ascending=True):
+    def get_position_value(pos):
+        col = ord(pos[0]) - ord("a")
+        row = int(pos[1]) - 1
+        return row * 8 + col
+
+    def sort_key(item):
+        pos, score = item
+        score_key = score if ascending else -score
+        return (score_key, get_position_value(pos))
+
+    return sorted(positions, key=sort_key)
+
+
+def load_states(jsonl_paths, max_samples):
+    """Collect (board, [(move, score), ...]) of every printed position of generated traces, root and search nodes."""
+    states = []
+    for idx, record in enumerate(parse_jsonl(jsonl_paths)):
+        if idx >= max_samples:
+            break
+        for node in [record] + record["search"]:
+            if node["board"] is not None and len(node["board"]) == 8:
+                states.append((node["board"], node["possible_moves"]))
+    return states
+
+
+def bench(name, func, reference, states, repeat=5):
+    assert all(func(*x) == reference(*x) for x in states), f"{name} output differs from the reference"
+    times = []
+    for f in [reference, func]:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for x in states:
+                f(*x)
+            best = min(best, time.perf_counter() - start)
+        times.append(best)
+    print(f"{name:24s} reference {times[0] * 1e3:8.2f} ms  tables {times[1] * 1e3:8.2f} ms  speedup {times[0] / times[1]:5.2f}x")
+
+
+if __name__ == "__main__":
+    import glob
+
+    JSONL_PATHS = sorted(glob.glob("data/*.jsonl"))
+    MAX_SAMPLES = 2000
+
+    states = load_states(JSONL_PATHS, MAX_SAMPLES)
+    print(f"Loaded {len(states)} positions from the traces in {len(JSONL_PATHS)} files.")
+
+    boards = [(board,) for board, _ in states]
+    scores = [(score,) for _, possible_moves in states for _, score in possible_moves] + [(float("inf"),), (float("-inf"),)]
+    moves = [(possible_moves,) for _, possible_moves in states if possible_moves]
+    sort_args = [(possible_moves, False) for _, possible_moves in states if possible_moves]
+
+    bench("format_board", format_board, format_board_reference, boards)
+    bench("format_score", format_score, format_score_reference, scores)
+    bench("format_possible_moves", format_possible_moves, format_possible_moves_reference, moves)
+    bench("sort_positions", sort_positions, sort_positions_reference, sort_args)
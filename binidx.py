@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import struct
+from array import array
+import numpy as np
+from shard_writer import manifest_path, read_manifest
+
+
+# .idx layout of RWKV-LM's binidx (Megatron MMapIndexedDataset):
+# magic, version <Q, dtype code <B, number of sizes <Q, number of doc_idx <Q, sizes int32, pointers int64, doc_idx int64
+INDEX_MAGIC = b"MMIDIDX\x00\x00"
+UINT16_CODE = 8
+END_OF_DOCUMENT = 0  # RWKV-LM's make_data.py appends token 0 to every document
+
+
+def write_index(path, sizes):
+    sizes = np.asarray(sizes, dtype=np.int32)
+    pointers = np.zeros(len(sizes), dtype=np.int64)
+    np.cumsum(sizes[:-1] * 2, out=pointers[1:])  # byte offsets of uint16 tokens
+    doc_idx = np.arange(len(sizes) + 1, dtype=np.int64)  # one sample per document
+    with open(path, "wb") as f:
+        f.write(INDEX_MAGIC)
+        f.write(struct.pack("<Q", 1))
+        f.write(struct.pack("<B", UINT16_CODE))
+        f.write(struct.pack("<Q", len(sizes)))
+        f.write(struct.pack("<Q", len(doc_idx)))
+        f.write(sizes.tobytes(order="C"))
+        f.write(pointers.tobytes(order="C"))
+        f.write(doc_idx.tobytes(order="C"))
+
+
+class BinidxReader:
+    """Memory-mapped reader of a `<prefix>.bin`/`<prefix>.idx` pair, `reader[i]` is the uint16 tokens of document i."""
+
+    def __init__(self, prefix):
+        with open(prefix + ".idx", "rb") as f:
+            assert f.read(9) == INDEX_MAGIC, "Not a binidx index"
+            version, code, count, doc_count = struct.unpack("<QBQQ", f.read(25))
+            assert version == 1 and code == UINT16_CODE, "Only uint16 binidx is supported"
+            offset = f.tell()
+        index = np.memmap(prefix + ".idx", mode="r", offset=offset, dtype=np.uint8)
+        self.sizes = index[: count * 4].view(np.int32)
+        self.pointers = index[count * 4 : count * 12].view(np.int64)
+        self.tokens = np.memmap(prefix + ".bin", mode="r", dtype=np.uint16) if count else np.zeros(0, dtype=np.uint16)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, idx):
+        start = self.pointers[idx] // 2
+        return self.tokens[start : start + self.sizes[idx]]
+
+
+class BinidxWriter:
+    """
+    Appends samples as token ids to `<prefix>.bin` and writes `<prefix>.idx` on close, the format RWKV-LM trains on,
+    so the JSONL -> binidx conversion pass is not needed. Every document ends with token 0 like in RWKV-LM's make_data.py.
+    Same batching, atomic rename and manifest as `ShardedJsonlWriter`, the manifest also keeps the document sizes
+    so `resume=True` can rebuild the index of an interrupted run.
+    """
+
+    sample_type = "tokens"  # what `write` takes, see `OthelloGenerator.gen_one_tokens`
+
+    def __init__(self, prefix, flush_bytes=1 << 20, flush_interval=5.0, resume=False):
+        self.prefix = prefix
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.file = None
+        self.file_bytes = 0
+        self.sizes = array("i")
+        self.buffer = array("H")
+        self.buffer_sizes = []
+        self.buffer_keys = []
+        self.last_flush = time.monotonic()
+        self.manifest = None
+        self.resume = resume
+        self.done = set()
+        if resume:
+            self._recover()
+        elif os.path.exists(manifest_path(prefix)):
+            os.remove(manifest_path(prefix))
+
+    def _recover(self):
+        entries = read_manifest(self.prefix)
+        bin_path = self.prefix + ".bin"
+        if os.path.exists(bin_path):  # finished run, continue it
+            os.replace(bin_path, bin_path + ".tmp")
+        if os.path.exists(bin_path + ".tmp"):
+            with open(bin_path + ".tmp", "r+b") as f:
+                f.truncate(entries[-1]["bytes"] if entries else 0)
+        for entry in entries:
+            self.sizes.extend(entry["sizes"])
+            self.done.update(entry["done"])
+        self.file_bytes = entries[-1]["bytes"] if entries else 0
+
+    def write(self, tokens, key=None):
+        if self.file is None:
+            self.file = open(self.prefix + ".bin.tmp", "ab" if self.file_bytes else "wb")
+        self.buffer.extend(tokens)
+        self.buffer.append(END_OF_DOCUMENT)
+        self.buffer_sizes.append(len(tokens) + 1)
+        if key is not None:
+            self.buffer_keys.append(key)
+        if len(self.buffer) * 2 >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer_sizes:
+            self.file.write(self.buffer.tobytes())
+            self.file.flush()
+            self.file_bytes += len(self.buffer) * 2
+            self.sizes.extend(self.buffer_sizes)
+            if self.manifest is None:
+                self.manifest = open(manifest_path(self.prefix), "a", encoding="utf-8")
+            entry = {"file": self.prefix, "bytes": self.file_bytes, "sizes": self.buffer_sizes, "done": self.buffer_keys}
+            self.manifest.write(json.dumps(entry) + "\n")
+            self.manifest.flush()
+            self.done.update(self.buffer_keys)
+            self.buffer = array("H")
+            self.buffer_sizes = []
+            self.buffer_keys = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file is None and not self.file_bytes:
+            return
+        if self.file is None:  # resumed, nothing new written
+            self.file = open(self.prefix + ".bin.tmp", "ab")
+        self.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        write_index(self.prefix + ".idx.tmp", self.sizes)
+        os.replace(self.prefix + ".bin.tmp", self.prefix + ".bin")
+        os.replace(self.prefix + ".idx.tmp", self.prefix + ".idx")
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
+
+    @staticmethod
+    def recover(prefix):
+        """Keys of the samples recorded in the manifest, the files are recovered when the writer is resumed."""
+        return {key for entry in read_manifest(prefix) for key in entry["done"]}
+
+    @staticmethod
+    def existing_files(prefix):
+        files = [prefix + ".bin", prefix + ".idx", prefix + ".bin.tmp", prefix + ".idx.tmp", manifest_path(prefix)]
+        return [path for path in files if os.path.exists(path)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def merge_binidx(prefixes, output_prefix, chunk_tokens=1 << 24):
+    """Concatenate binidx pairs, e.g. the per-worker outputs of `OthelloProcessPool`, into one."""
+    sizes = []
+    with open(output_prefix + ".bin.tmp", "wb") as f:
+        for prefix in prefixes:
+            reader = BinidxReader(prefix)
+            for i in range(0, len(reader.tokens), chunk_tokens):
+                f.write(np.asarray(reader.tokens[i : i + chunk_tokens]).tobytes())
+            sizes.append(np.asarray(reader.sizes))
+    write_index(output_prefix + ".idx.tmp", np.concatenate(sizes) if sizes else [])
+    os.replace(output_prefix + ".bin.tmp", output_prefix + ".bin")
+    os.replace(output_prefix + ".idx.tmp", output_prefix + ".idx")
+
+
+def verify_binidx(prefix, jsonl_paths, num_docs=1000, seed=0):
+    """
+    Decode random documents of a binidx file and check that each one is a sample of the JSONL output
+    generated with the same settings, tokenizes back to the same ids and ends with token 0.
+    Returns the number of mismatches.
+    """
+    import hashlib
+    from othello_tokenizer import OTHELLO_TOKENIZER
+    from block_jsonl import iter_jsonl
+
+    texts = set()
+    for path in jsonl_paths:
+        for line in iter_jsonl(path):
+            texts.add(hashlib.md5(json.loads(line)["text"].encode("utf-8")).digest())
+
+    tokenizer = OTHELLO_TOKENIZER()
+    reader = BinidxReader(prefix)
+    rng = np.random.default_rng(seed)
+    mismatches = 0
+    for idx in rng.choice(len(reader), size=min(num_docs, len(reader)), replace=False):
+        tokens = reader[idx].tolist()
+        text = tokenizer.decode(tokens[:-1])
+        if tokens[-1] != END_OF_DOCUMENT or tokenizer.encode(text) != tokens[:-1]:
+            mismatches += 1
+        elif hashlib.md5(text.encode("utf-8")).digest() not in texts:
+            mismatches += 1
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python binidx.py data/x data/x.jsonl ... -> check data/x.bin/.idx against the JSONL output
+    mismatches = verify_binidx(sys.argv[1], sys.argv[2:])
+    print(f"{mismatches} mismatches.")
@@ -0,0 +1,269 @@
+import os
+import gzip
+import lzma
+import json
+import time
+import struct
+from bisect import bisect_right
+import numpy as np
+from shard_writer import manifest_path, read_manifest
+
+
+# every block is a complete gzip member / xz stream, so the whole file also reads with zcat, xzcat, gzip.open, lzma.open
+CODECS = {
+    "gzip": (lambda data, level: gzip.compress(data, compresslevel=6 if level is None else level, mtime=0), gzip.decompress, gzip.open),
+    "lzma": (lambda data, level: lzma.compress(data, preset=6 if level is None else level), lzma.decompress, lzma.open),
+}
+EXTENSIONS = {".gz": "gzip", ".xz": "lzma"}
+
+# <path>.idx: magic, codec name, block count, (count + 1) int64 byte offsets, (count + 1) int64 first sample of every block
+INDEX_MAGIC = b"OTBI"
+INDEX_HEADER = struct.Struct("<4s4sQ")
+
+
+def codec_of(path):
+    """data/x.jsonl.gz -> "gzip", data/x.jsonl.xz -> "lzma", None for uncompressed files."""
+    return EXTENSIONS.get(os.path.splitext(path)[1])
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def write_block_index(path, codec, blocks):
+    """`blocks` are (byte offset, compressed size, sample count) of every block."""
+    offsets = np.zeros(len(blocks) + 1, dtype=np.int64)
+    first_sample = np.zeros(len(blocks) + 1, dtype=np.int64)
+    if blocks:
+        np.cumsum([size for _, size, _ in blocks], out=offsets[1:])
+        np.cumsum([count for _, _, count in blocks], out=first_sample[1:])
+    with open(path, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, codec.encode()[:4], len(blocks)))
+        f.write(offsets.tobytes())
+        f.write(first_sample.tobytes())
+
+
+class BlockCompressedWriter:
+    """
+    JSONL writer that compresses its output in independent blocks of about `block_bytes` uncompressed bytes
+    and writes a block index (`<path>.idx`) on close, so `BlockCompressedReader` can seek to any sample.
+    The codec comes from the extension of `path` (.gz or .xz) unless given. Same batching, atomic rename and manifest
+    as `ShardedJsonlWriter`, blocks are recorded in the manifest when they are flushed so `resume=True` can
+    rebuild the index of an interrupted run. A flush by `flush_interval` ends the current block early.
+    """
+
+    sample_type = "json_line"  # what `write` takes, see `OthelloGenerator.gen_one_json_line`
+
+    def __init__(self, path, codec=None, level=None, block_bytes=1 << 20, flush_interval=5.0, resume=False):
+        self.path = path
+        self.codec = codec or codec_of(path)
+        assert self.codec in CODECS, f"Unknown codec for {path}, use a .gz or .xz file name"
+        self.compress = CODECS[self.codec][0]
+        self.level = level
+        self.block_bytes = block_bytes
+        self.flush_interval = flush_interval
+        self.file = None
+        self.file_bytes = 0
+        self.blocks = []  # (offset, compressed size, sample count)
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_keys = []
+        self.unrecorded_blocks = []  # written, not in the manifest yet
+        self.unrecorded_keys = []
+        self.last_flush = time.monotonic()
+        self.manifest = None
+        self.done = set()
+        if resume:
+            self._recover()
+        elif os.path.exists(manifest_path(path)):
+            os.remove(manifest_path(path))
+
+    def _recover(self):
+        entries = read_manifest(self.path)
+        if os.path.exists(self.path):  # finished run, continue it
+            os.replace(self.path, self.path + ".tmp")
+        if os.path.exists(self.path + ".tmp"):
+            with open(self.path + ".tmp", "r+b") as f:
+                f.truncate(entries[-1]["bytes"] if entries else 0)
+        for entry in entries:
+            self.blocks.extend(tuple(block) for block in entry["blocks"])
+            self.done.update(entry["done"])
+        self.file_bytes = entries[-1]["bytes"] if entries else 0
+
+    def _write_block(self):
+        data = self.compress(b"".join(self.buffer), self.level)
+        self.file.write(data)
+        block = (self.file_bytes, len(data), len(self.buffer))
+        self.blocks.append(block)
+        self.unrecorded_blocks.append(block)
+        self.unrecorded_keys.extend(self.buffer_keys)
+        self.file_bytes += len(data)
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_keys = []
+
+    def write(self, line: str, key=None):
+        if self.file is None:
+            self.file = open(self.path + ".tmp", "ab" if self.file_bytes else "wb")
+        data = line.encode("utf-8")
+        self.buffer.append(data)
+        self.buffer_bytes += len(data)
+        if key is not None:
+            self.buffer_keys.append(key)
+        if self.buffer_bytes >= self.block_bytes:
+            self._write_block()
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self._write_block()
+        if self.unrecorded_blocks:
+            # the blocks have to reach the file before they are recorded as done
+            self.file.flush()
+            if self.manifest is None:
+                self.manifest = open(manifest_path(self.path), "a", encoding="utf-8")
+            entry = {"file": self.path, "bytes": self.file_bytes, "blocks": self.unrecorded_blocks, "done": self.unrecorded_keys}
+            self.manifest.write(json.dumps(entry) + "\n")
+            self.manifest.flush()
+            self.done.update(self.unrecorded_keys)
+            self.unrecorded_blocks = []
+            self.unrecorded_keys = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file is None and not self.file_bytes:
+            return
+        if self.file is None:  # resumed, nothing new written
+            self.file = open(self.path + ".tmp", "ab")
+        self.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        write_block_index(index_path(self.path) + ".tmp", self.codec, self.blocks)
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(index_path(self.path) + ".tmp", index_path(self.path))
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
+
+    @staticmethod
+    def recover(path):
+        """Keys of the samples recorded in the manifest, the file is recovered when the writer is resumed."""
+        return {key for entry in read_manifest(path) for key in entry["done"]}
+
+    @staticmethod
+    def existing_files(path):
+        files = [path, index_path(path), path + ".tmp", index_path(path) + ".tmp", manifest_path(path)]
+        return [file for file in files if os.path.exists(file)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class BlockCompressedReader:
+    """
+    Random access to a file written by `BlockCompressedWriter`: `reader[n]` is the JSON line of sample n,
+    only its block is read and decompressed. The last decompressed block is kept, so reading in order is cheap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(index_path(path), "rb") as f:
+            magic, codec, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{index_path(path)} is not a block index.")
+            self.codec = codec.rstrip(b"\0").decode()
+            self.offsets = np.frombuffer(f.read((count + 1) * 8), dtype=np.int64)
+            self.first_sample = np.frombuffer(f.read((count + 1) * 8), dtype=np.int64)
+        self.decompress = CODECS[self.codec][1]
+        self.file = open(path, "rb")
+        self.cached_block = None
+        self.cached_lines = None
+
+    def __len__(self):
+        return int(self.first_sample[-1])
+
+    @property
+    def block_count(self):
+        return len(self.offsets) - 1
+
+    def read_block(self, block):
+        """JSON lines of a block, with their "\\n"."""
+        if block != self.cached_block:
+            self.file.seek(int(self.offsets[block]))
+            data = self.decompress(self.file.read(int(self.offsets[block + 1] - self.offsets[block])))
+            self.cached_lines = [line + "\n" for line in data.decode("utf-8").split("\n")[:-1]]
+            self.cached_block = block
+        return self.cached_lines
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        block = bisect_right(self.first_sample, idx) - 1
+        return self.read_block(block)[idx - int(self.first_sample[block])]
+
+    def iter_lines(self, start=0, end=None):
+        end = len(self) if end is None else min(end, len(self))
+        idx = max(start, 0)
+        while idx < end:
+            block = bisect_right(self.first_sample, idx) - 1
+            lines = self.read_block(block)
+            local = idx - int(self.first_sample[block])
+            for line in lines[local : local + end - idx]:
+                yield line
+            idx += len(lines[local : local + end - idx])
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_jsonl(path):
+    """
+    Lines of a JSONL output, plain or written by `BlockCompressedWriter`. Compressed files without their index
+    (e.g. an interrupted run) are streamed from the start.
+    """
+    codec = codec_of(path)
+    if codec is None:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from f
+    elif os.path.exists(index_path(path)):
+        with BlockCompressedReader(path) as reader:
+            yield from reader.iter_lines()
+    else:
+        with CODECS[codec][2](path, "rt", encoding="utf-8") as f:
+            yield from f
+
+
+def compress_jsonl(input_path, output_path, block_bytes=1 << 20, level=None):
+    """Convert an existing JSONL file, e.g. `compress_jsonl("data/x.jsonl", "data/x.jsonl.xz")`."""
+    with BlockCompressedWriter(output_path, level=level, block_bytes=block_bytes, flush_interval=float("inf")) as writer:
+        for line in iter_jsonl(input_path):
+            writer.write(line)
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python block_jsonl.py data/x.jsonl data/x.jsonl.gz -> compress and compare sizes and read speed
+    INPUT_PATH, OUTPUT_PATH = sys.argv[1], sys.argv[2]
+
+    t0 = time.time()
+    compress_jsonl(INPUT_PATH, OUTPUT_PATH)
+    ratio = os.path.getsize(INPUT_PATH) / os.path.getsize(OUTPUT_PATH)
+    print(f"Compressed {ratio:.1f}x in {time.time() - t0:.2f}s")
+    with BlockCompressedReader(OUTPUT_PATH) as reader:
+        t0 = time.time()
+        line = reader[len(reader) // 2]
+        print(f"{len(reader)} samples in {reader.block_count} blocks, sample {len(reader) // 2} read in {time.time() - t0:.4f}s")
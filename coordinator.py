@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+import socketserver
+
+
+class LeaseCoordinator:
+    """
+    Hands out the game ranges [start, end) of a run in pieces of `range_size` games.
+    A lease expires after `lease_timeout` seconds without a renewal and its range goes back to the pool,
+    so ranges of dead workers are picked up by others. Only the first completion of a range is accepted,
+    the output of a worker that lost its lease is reported as stale and must not be used. A worker that finishes
+    after its lease expired still completes the range if nobody else has leased it meanwhile.
+    Completions are appended to `journal_path`, a restarted coordinator does not hand them out again.
+    """
+
+    def __init__(self, start, end, range_size, lease_timeout=120.0, journal_path=None):
+        self.ranges = [(lo, min(lo + range_size, end)) for lo in range(start, end, range_size)]
+        self.lease_timeout = lease_timeout
+        self.journal_path = journal_path
+        self.lock = threading.Lock()
+        self.leases = {}  # token -> (range id, worker, expiry)
+        self.expired = {}  # token -> range id
+        self.completed = {}  # range id -> outputs
+        if journal_path and os.path.exists(journal_path):
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:  # torn last line
+                        break
+                    if entry["range"] < len(self.ranges) and tuple(self.ranges[entry["range"]]) == tuple(entry["games"]):
+                        self.completed[entry["range"]] = entry["outputs"]
+
+    def _expire(self):
+        now = time.monotonic()
+        for token in [token for token, (_, _, expiry) in self.leases.items() if expiry < now]:
+            self.expired[token] = self.leases.pop(token)[0]
+
+    def lease(self, worker):
+        """{"range", "start", "end", "lease", "timeout"}, {"wait": seconds} while other leases are open, or {"finished": True}."""
+        with self.lock:
+            self._expire()
+            leased = {range_id for range_id, _, _ in self.leases.values()}
+            for range_id, (lo, hi) in enumerate(self.ranges):
+                if range_id not in self.completed and range_id not in leased:
+                    token = uuid.uuid4().hex[:12]
+                    self.leases[token] = (range_id, worker, time.monotonic() + self.lease_timeout)
+                    return {"range": range_id, "start": lo, "end": hi, "lease": token, "timeout": self.lease_timeout}
+            if leased:
+                return {"wait": min(self.lease_timeout / 4, 5.0)}
+            return {"finished": True}
+
+    def renew(self, token):
+        with self.lock:
+            self._expire()
+            if token not in self.leases:
+                return {"ok": False}
+            range_id, worker, _ = self.leases[token]
+            self.leases[token] = (range_id, worker, time.monotonic() + self.lease_timeout)
+            return {"ok": True}
+
+    def complete(self, token, outputs):
+        with self.lock:
+            self._expire()
+            if token in self.leases:
+                range_id = self.leases.pop(token)[0]
+            elif token in self.expired:
+                range_id = self.expired.pop(token)
+                if range_id in self.completed or any(r == range_id for r, _, _ in self.leases.values()):
+                    return {"ok": False}
+            else:
+                return {"ok": False}
+            self.completed[range_id] = outputs
+            if self.journal_path:
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"range": range_id, "games": self.ranges[range_id], "outputs": outputs}) + "\n")
+            return {"ok": True}
+
+    def status(self):
+        with self.lock:
+            self._expire()
+            return {
+                "ranges": len(self.ranges),
+                "completed": len(self.completed),
+                "leased": {token: [range_id, worker] for token, (range_id, worker, _) in self.leases.items()},
+                "outputs": [path for range_id in sorted(self.completed) for path in self.completed[range_id]],
+            }
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "lease":
+            return self.lease(request.get("worker", "?"))
+        if op == "renew":
+            return self.renew(request["lease"])
+        if op == "complete":
+            return self.complete(request["lease"], request.get("outputs", []))
+        if op == "status":
+            return self.status()
+        return {"error": f"Unknown op {op!r}"}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:  # one JSON request per line, one JSON response per line
+            try:
+                response = self.server.coordinator.handle(json.loads(line))
+            except Exception as e:
+                response = {"error": repr(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, coordinator):
+        super().__init__(address, _Handler)
+        self.coordinator = coordinator
+
+
+class CoordinatorClient:
+    """Connection to a `CoordinatorServer`, safe to share between the worker and its heartbeat thread."""
+
+    def __init__(self, host, port, timeout=30.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sock = None
+        self.file = None
+
+    def request(self, op, **kwargs):
+        with self.lock:
+            for attempt in range(2):  # reconnect once, e.g. after a coordinator restart
+                try:
+                    if self.sock is None:
+                        self.sock = socket.create_connection(self.address, timeout=self.timeout)
+                        self.file = self.sock.makefile("rwb")
+                    self.file.write((json.dumps({"op": op, **kwargs}) + "\n").encode("utf-8"))
+                    self.file.flush()
+                    line = self.file.readline()
+                    if not line:
+                        raise ConnectionError("Coordinator closed the connection")
+                    return json.loads(line)
+                except OSError:
+                    self.close()
+                    if attempt:
+                        raise
+
+    def close(self):
+        if self.sock is not None:
+            self.file.close()
+            self.sock.close()
+            self.sock = None
+            self.file = None
+
+
+def run_worker(client, generate_range, worker_name=None):
+    """
+    Lease ranges from the coordinator until all are done. `generate_range(start, end, range_id, lease)` generates
+    the games start..end-1 into outputs of its own and returns their paths. The lease is renewed in the background
+    while it runs. Returns the number of ranges this worker completed.
+    """
+    worker_name = worker_name or f"{socket.gethostname()}:{os.getpid()}"
+    completed = 0
+    while True:
+        response = client.request("lease", worker=worker_name)
+        if response.get("finished"):
+            return completed
+        if "wait" in response:
+            time.sleep(response["wait"])
+            continue
+
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(response["timeout"] / 3):
+                try:
+                    renewed = client.request("renew", lease=response["lease"])["ok"]
+                except OSError:  # coordinator unreachable, keep trying until the lease runs out
+                    continue
+                if not renewed:
+                    print(f"Lost the lease of range {response['range']}, its output may be discarded.")
+                    return
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            outputs = generate_range(response["start"], response["end"], response["range"], response["lease"])
+        finally:
+            stop.set()
+            thread.join()
+        if client.request("complete", lease=response["lease"], outputs=outputs)["ok"]:
+            completed += 1
+        else:
+            print(f"Range {response['range']} was reassigned, not recording {outputs}.")
+
+
+if __name__ == "__main__":
+    # start the coordinator once, then workers on any host with COORDINATOR = (HOST, PORT) in generate_data.py
+    HOST = "0.0.0.0"
+    PORT = 8765
+    START = 0
+    END = 1000000
+    RANGE_SIZE = 10000  # games per lease
+    LEASE_TIMEOUT = 300.0  # seconds without a renewal before a range is handed to another worker
+    JOURNAL_PATH = f"data/leases_s{START}_e{END}.jsonl"  # completed ranges and their outputs
+
+    os.makedirs(os.path.dirname(JOURNAL_PATH), exist_ok=True)
+    coordinator = LeaseCoordinator(START, END, RANGE_SIZE, LEASE_TIMEOUT, JOURNAL_PATH)
+    with CoordinatorServer((HOST, PORT), coordinator) as server:
+        print(f"Serving {len(coordinator.ranges)} ranges on {HOST}:{PORT}, {len(coordinator.completed)} already done.")
+        server.serve_forever()
@@ -0,0 +1,176 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import multiprocessing as mp
+import numpy as np
+from othello import Othello
+from position_table import canonical_position
+from trace_parser import TraceParser
+from block_jsonl import BlockCompressedWriter, codec_of, iter_jsonl
+
+
+# spill record of one sample: 128-bit hash of its key, input file, line in the file
+RECORD = np.dtype([("h1", "<u8"), ("h2", "<u8"), ("file", "<u4"), ("line", "<u8")])
+
+
+def input_block(line):
+    """Text of the <input> block of a JSONL sample, without decoding the rest of the line."""
+    end = line.index("</input>")
+    return json.loads(line[:end] + '"}')["text"]
+
+
+def sample_hash(line, key="input"):
+    """
+    16-byte hash of what makes two samples duplicates. key="input": the <input> block (board, player, width, depth),
+    key="canonical": the same with the board reduced by the 8 symmetries, so mirrored positions count as duplicates.
+    """
+    block = input_block(line)
+    if key == "canonical":
+        parser = TraceParser()
+        parser.feed(block)
+        record = parser.close()
+        position, _ = canonical_position(record["board"], record["player"])
+        block = position.hex() + f" {record['max_width']} {record['max_depth']}"
+    return hashlib.blake2b(block.encode("utf-8"), digest_size=16).digest()
+
+
+def _hash_file(args):
+    file_idx, path, key = args
+    hashes = [sample_hash(line, key) for line in iter_jsonl(path)]
+    records = np.zeros(len(hashes), dtype=RECORD)
+    if hashes:
+        packed = np.frombuffer(b"".join(hashes), dtype="<u8").reshape(-1, 2)
+        records["h1"], records["h2"] = packed[:, 0], packed[:, 1]
+    records["file"] = file_idx
+    records["line"] = np.arange(len(hashes))
+    return records
+
+
+def _rewrite_file(args):
+    path, drops_path, output_path = args
+    drops = np.sort(np.fromfile(drops_path, dtype="<u8")) if os.path.exists(drops_path) else np.zeros(0, dtype="<u8")
+    next_drop = 0
+    if codec_of(output_path):
+        writer = BlockCompressedWriter(output_path, flush_interval=float("inf"))
+        write = writer.write
+    else:
+        writer = open(output_path + ".tmp", "w", encoding="utf-8")
+        write = writer.write
+    for idx, line in enumerate(iter_jsonl(path)):
+        if next_drop < len(drops) and drops[next_drop] == idx:
+            next_drop += 1
+            continue
+        write(line)
+    writer.close()
+    if not codec_of(output_path):
+        os.replace(output_path + ".tmp", output_path)
+
+
+def dedup_jsonl(paths, output_dir=None, key="input", num_partitions=64, num_workers=None, spill_dir=None, report_path=None):
+    """
+    Remove exact duplicate samples across JSONL outputs (plain or block-compressed) with bounded memory.
+    Pass 1 hashes every sample (files in parallel) and spills (hash, file, line) records into `num_partitions`
+    files by hash, pass 2 loads one partition at a time and marks every repeat of a hash after its first occurrence
+    in `paths` order, pass 3 rewrites each file without its marked lines into `output_dir` (same file names).
+    Without `output_dir` only the report is made. Memory is about one partition, 32 bytes per sample / num_partitions.
+    Returns the report: sample and duplicate counts, in total and per file.
+    """
+    spill_dir = tempfile.mkdtemp(prefix="dedup_", dir=spill_dir)
+    try:
+        partitions = [open(os.path.join(spill_dir, f"p{i:04d}.bin"), "wb") for i in range(num_partitions)]
+        samples = [0] * len(paths)
+        with mp.Pool(num_workers) as pool:
+            for records in pool.imap(_hash_file, [(i, path, key) for i, path in enumerate(paths)]):
+                if len(records):
+                    samples[int(records["file"][0])] = len(records)
+                    part = records["h1"] % num_partitions
+                    order = np.argsort(part, kind="stable")
+                    bounds = np.searchsorted(part[order], np.arange(num_partitions + 1))
+                    for i in range(num_partitions):
+                        if bounds[i] < bounds[i + 1]:
+                            partitions[i].write(records[order[bounds[i] : bounds[i + 1]]].tobytes())
+        for f in partitions:
+            f.close()
+
+        duplicates = [0] * len(paths)
+        for i in range(num_partitions):
+            records = np.fromfile(os.path.join(spill_dir, f"p{i:04d}.bin"), dtype=RECORD)
+            if not len(records):
+                continue
+            records = records[np.lexsort((records["line"], records["file"], records["h2"], records["h1"]))]
+            repeat = np.zeros(len(records), dtype=bool)
+            repeat[1:] = (records["h1"][1:] == records["h1"][:-1]) & (records["h2"][1:] == records["h2"][:-1])
+            dropped = records[repeat]
+            for file_idx in np.unique(dropped["file"]).tolist():
+                lines = dropped["line"][dropped["file"] == file_idx]
+                duplicates[file_idx] += len(lines)
+                with open(os.path.join(spill_dir, f"drops_{file_idx:06d}.bin"), "ab") as f:
+                    f.write(lines.astype("<u8").tobytes())
+
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            tasks = [
+                (path, os.path.join(spill_dir, f"drops_{i:06d}.bin"), os.path.join(output_dir, os.path.basename(path)))
+                for i, path in enumerate(paths)
+            ]
+            with mp.Pool(num_workers) as pool:
+                list(pool.imap_unordered(_rewrite_file, tasks))
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    total, dropped = sum(samples), sum(duplicates)
+    report = {
+        "key": key,
+        "samples": total,
+        "unique": total - dropped,
+        "duplicates": dropped,
+        "duplicate_rate": dropped / total if total else 0.0,
+        "files": {path: {"samples": n, "duplicates": d} for path, n, d in zip(paths, samples, duplicates)},
+    }
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def dedup_inputs(inputs, by="position"):
+    """
+    Drop generation inputs [(moves, width, depth, ...), ...] that would give a duplicate sample before any engine
+    work is spent: same position (after replaying the moves, so transpositions count) and same width and depth.
+    by="canonical" also counts the symmetric positions. The first occurrence is kept, extra fields are kept as they are.
+    """
+    assert by in ["position", "canonical"], "Invalid dedup key"
+    game = Othello()
+    seen = set()
+    seen_moves = set()  # same moves string, skips the replay
+    kept = []
+    for item in inputs:
+        moves, max_width, max_depth = item[0], item[1], item[2]
+        if (moves, max_width, max_depth) in seen_moves:
+            continue
+        seen_moves.add((moves, max_width, max_depth))
+        game.play_from_start(moves)
+        if by == "canonical":
+            position = canonical_position(game.board, game.current_player)[0]
+        else:
+            position = game.get_board_format()
+        key = (position, max_width, max_depth)
+        if key not in seen:
+            seen.add(key)
+            kept.append(item)
+    print(f"Dedup by {by}: kept {len(kept)}, dropped {len(inputs) - len(kept)} duplicates.")
+    return kept
+
+
+if __name__ == "__main__":
+    import glob
+
+    # report the duplicates of all outputs and write deduplicated copies
+    JSONL_PATHS = sorted(glob.glob("data/*.jsonl") + glob.glob("data/*.jsonl.gz") + glob.glob("data/*.jsonl.xz"))
+    OUTPUT_DIR = "data/dedup"
+    KEY = "input"  # "canonical" to also drop mirrored and rotated positions
+
+    report = dedup_jsonl(JSONL_PATHS, OUTPUT_DIR, KEY, report_path=os.path.join(OUTPUT_DIR, "report.json"))
+    print(f"{report['samples']} samples, {report['duplicates']} duplicates ({report['duplicate_rate']:.2%}).")
@@ -0,0 +1,133 @@
+from othello import Othello
+from formatter import SQUARE_NAMES
+
+
+def _build_rays():
+    directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
+    rays = []
+    for idx in range(64):
+        row, col = divmod(idx, 8)
+        square_rays = []
+        for dx, dy in directions:
+            ray = []
+            x, y = row + dx, col + dy
+            while 0 <= x < 8 and 0 <= y < 8:
+                ray.append(1 << (x * 8 + y))
+                x += dx
+                y += dy
+            if len(ray) >= 2:
+                square_rays.append(ray)
+        rays.append(square_rays)
+    return rays
+
+
+RAYS = _build_rays()
+
+
+def board_to_bitboards(board, player):
+    """Convert an `Othello.board` to (player, opponent) bitboards, bit index = row * 8 + col."""
+    p = o = 0
+    for row in range(8):
+        for col in range(8):
+            cell = board[row][col]
+            if cell == player:
+                p |= 1 << (row * 8 + col)
+            elif cell:
+                o |= 1 << (row * 8 + col)
+    return p, o
+
+
+def get_flips(p, o, idx):
+    flips = 0
+    for ray in RAYS[idx]:
+        line = 0
+        for bit in ray:
+            if o & bit:
+                line |= bit
+            elif p & bit:
+                flips |= line
+                break
+            else:
+                break
+    return flips
+
+
+def final_score(p, o):
+    """Disc difference from the player's view, empties go to the winner."""
+    p_count = bin(p).count("1")
+    o_count = bin(o).count("1")
+    empties = 64 - p_count - o_count
+    if p_count > o_count:
+        return p_count - o_count + empties
+    if p_count < o_count:
+        return p_count - o_count - empties
+    return 0
+
+
+def negamax(p, o, alpha, beta, empties, passed=False):
+    """
+    Exact fail-soft negamax score of the position with `p` to move.
+    `empties` lists the empty squares; near the end it is cheaper to try each of them than to generate moves.
+    """
+    best = -65
+    for i, idx in enumerate(empties):
+        flips = get_flips(p, o, idx)
+        if not flips:
+            continue
+        score = -negamax(o ^ flips, p | flips | (1 << idx), -beta, -alpha, empties[:i] + empties[i + 1 :])
+        if score > best:
+            best = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+    if best == -65:  # no legal moves
+        if passed:
+            return -final_score(o, p)
+        return -negamax(o, p, -beta, -alpha, empties, passed=True)
+    return best
+
+
+def solve_moves(p, o):
+    """
+    Exact score of every legal move for the player `p`.
+    Returns [(move, score), ...] best first, in the same format as `OthelloEngine.get_moves`.
+    """
+    empties = [idx for idx in range(64) if not (p | o) >> idx & 1]
+    results = []
+    for i, idx in enumerate(empties):
+        flips = get_flips(p, o, idx)
+        if not flips:
+            continue
+        score = -negamax(o ^ flips, p | flips | (1 << idx), -64, 64, empties[:i] + empties[i + 1 :])
+        results.append((SQUARE_NAMES[idx], float(score)))
+    results.sort(key=lambda x: -x[1])
+    return results
+
+
+class EndgameSolver:
+    """
+    Exact endgame solver for positions with few empty squares.
+    Used by `OthelloEngine.get_moves` to skip the engine near the end of the game.
+    """
+
+    def __init__(self, max_empties=8):
+        self.max_empties = max_empties
+        self.game = Othello()
+
+    def solve(self, moves: str):
+        """Return the exact move scores of the position, or None if it has too many empties."""
+        moves = moves.replace("ps", "")
+        if 60 - len(moves) // 2 > self.max_empties:
+            return None
+        self.game.play_from_start(moves)
+        p, o = board_to_bitboards(self.game.board, self.game.current_player)
+        return solve_moves(p, o)
+
+
+if __name__ == "__main__":
+
+    solver = EndgameSolver(max_empties=10)
+    game = "d3e3f2c3e6f3g2f5e2d6b3f4g4h4c5e1h3h1h5c4d2g6g5f6h7g3f7b6b4e7b5h6h2g8c7d1d7a4e8h8g7a6a3f8b7b8c6a2d8c1b2a1c2b1a5a8a7c8g1f1"
+    print(solver.solve(game[:108]))
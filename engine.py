@@ -1,13 +1,24 @@
 import subprocess
 import platform
 import warnings
+import time
+from endgame import EndgameSolver
+from position_table import PositionTable
+from metrics import LatencyHistogram
 
 
 class OthelloEngine:
-    def __init__(self, path, level=15, threads=2):
+    def __init__(self, path, level=15, threads=2, endgame_empties=6, position_table=None):
         self.path = path
         self.level = level
         self.threads = threads
+        # positions with at most `endgame_empties` empty squares are solved locally, 0 to always ask the engine
+        self.endgame_solver = EndgameSolver(endgame_empties) if endgame_empties > 0 else None
+        # precomputed results of shallow positions, see position_table.py
+        self.position_table = PositionTable(position_table) if position_table else None
+        # where get_moves answers came from, and how long the engine took for the ones it had to answer
+        self.call_counts = {"table": 0, "endgame": 0, "engine": 0}
+        self.latency = LatencyHistogram()
         self._start_engine()
 
         self.restart_count_down = 0
@@ -95,8 +106,23 @@ class OthelloEngine:
         self.send_command("setboard " + board)
 
     def get_moves(self, moves: str):
+        if self.position_table is not None:
+            cached = self.position_table.lookup(moves)
+            if cached is not None:
+                self.call_counts["table"] += 1
+                return cached
+
+        if self.endgame_solver is not None:
+            solved = self.endgame_solver.solve(moves)
+            if solved is not None:
+                self.call_counts["endgame"] += 1
+                return solved
+
+        start = time.perf_counter()
         self.set_state_by_moves(moves)
         engine_output = self.send_command("hint 64", allow_restart=False)
+        self.latency.record(time.perf_counter() - start)
+        self.call_counts["engine"] += 1
         lst = engine_output.split("\n")
         lst = [x for x in lst if x.startswith("|")]
         lst = lst[1:]
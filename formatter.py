@@ -1,4 +1,12 @@
 from ast import literal_eval
+from itertools import product
+
+
+# precomputed tables, formatting sits on the hot path of data generation
+CELL_SYMBOLS = {0: "·", 1: "●", 2: "○"}
+ROW_STRINGS = {cells: " ".join(CELL_SYMBOLS[cell] for cell in cells) + " " for cells in product(range(3), repeat=8)}  # all 3^8 rows
+SQUARE_NAMES = [f"{chr(idx % 8 + 97)}{idx // 8 + 1}" for idx in range(64)]  # idx = row * 8 + col
+SQUARE_INDEX = {name: idx for idx, name in enumerate(SQUARE_NAMES)}
 
 
 def format_board(board):
@@ -8,14 +16,25 @@ def format_board(board):
     1 = black (●)
     2 = white (○)
     """
-    symbols = {0: "·", 1: "●", 2: "○"}
+    return "\n".join([ROW_STRINGS[tuple(row)] for row in board])
+
+
+def _format_score(score):
+    if score == float("inf"):
+        return "+in"
+    if score == float("-inf"):
+        return "-in"
+    score_int = int(score)
+    abs_score = abs(score_int)
+    if abs_score < 10:
+        return f"+0{abs_score}" if score_int >= 0 else f"-0{abs_score}"
+    else:
+        return f"+{score_int}" if score_int >= 0 else str(score_int)
 
-    rows = []
-    for row in board:
-        row_str = " ".join(symbols[cell] for cell in row)
-        rows.append(row_str + " ")
 
-    return "\n".join(rows)
+SCORE_STRINGS = {score: _format_score(score) for score in range(-64, 65)}
+SCORE_STRINGS[float("inf")] = "+in"
+SCORE_STRINGS[float("-inf")] = "-in"
 
 
 def format_score(score):
@@ -28,16 +47,8 @@ def format_score(score):
         -15 -> "-15"
         0 -> "+00"
     """
-    if score == float("inf"):
-        return "+in"
-    if score == float("-inf"):
-        return "-in"
-    score_int = int(score)
-    abs_score = abs(score_int)
-    if abs_score < 10:
-        return f"+0{abs_score}" if score_int >= 0 else f"-0{abs_score}"
-    else:
-        return f"+{score_int}" if score_int >= 0 else str(score_int)
+    result = SCORE_STRINGS.get(score)  # integral floats hash like ints
+    return result if result is not None else _format_score(score)
 
 
 def format_possible_moves(moves_list, sep=" "):
@@ -47,18 +58,9 @@ def format_possible_moves(moves_list, sep=" "):
     if isinstance(moves_list, str):
         moves_list = literal_eval(moves_list)
 
-    def position_to_value(pos):
-        col = ord(pos[0]) - ord("a")
-        row = int(pos[1])
-        return row * 10 + col
+    sorted_moves = sorted(moves_list, key=lambda x: SQUARE_INDEX[x[0]])
 
-    sorted_moves = sorted(moves_list, key=lambda x: position_to_value(x[0]))
-
-    formatted_lines = []
-    for pos, score in sorted_moves:
-        formatted_lines.append(f"{pos:2s} {format_score(score)}")
-
-    return " " + sep.join(formatted_lines)
+    return " " + sep.join([f"{pos:2s} {format_score(score)}" for pos, score in sorted_moves])
 
 
 def format_possible_moves_no_sort(moves_list, sep=" "):
@@ -68,11 +70,7 @@ def format_possible_moves_no_sort(moves_list, sep=" "):
     if isinstance(moves_list, str):
         moves_list = literal_eval(moves_list)
 
-    formatted_lines = []
-    for pos, score in moves_list:
-        formatted_lines.append(f"{pos:2s} {format_score(score)}")
-
-    return " " + sep.join(formatted_lines)
+    return " " + sep.join([f"{pos:2s} {format_score(score)}" for pos, score in moves_list])
 
 
 def format_args(max_width, max_depth):
@@ -83,27 +81,22 @@ def format_color(color):
     return "NEXT " + {1: "● ", 2: "○ "}[color]
 
 
-def format_stack(stack):
-    formatted_lines = []
-    for node in stack:
-        move = node["move"] if node["move"] else "--"
-        score = format_score(node["score"]) if node["score"] is not None else "---"
-        remaining_moves = format_possible_moves_no_sort(node["remaining_moves"], sep=" ")
-        remaining_depth = "Remaining_Depth:" + str(node["remaining_depth"])
-        is_max = "Max_Node" if node["is_max"] else "Min_Node"
-        best_move = "--" if not node["best_move"] else node["best_move"]
-        alpha = format_score(node["alpha"])
-        beta = format_score(node["beta"])
-
-        # formatted_lines.append(
-        #     f"{is_max} {remaining_depth} Alpha: {alpha} Beta: {beta} Best: {best_move} Current: {move} {score} Unexplored: {remaining_moves}"
-        # )
-        formatted_lines.append(
-            f"{is_max} Alpha: {alpha} Beta: {beta} Best: {best_move} Current: {move} {score} Unexplored:{remaining_moves}"
-        )
+def format_stack_line(node):
+    move = node["move"] if node["move"] else "--"
+    score = format_score(node["score"]) if node["score"] is not None else "---"
+    remaining_moves = format_possible_moves_no_sort(node["remaining_moves"], sep=" ")
+    is_max = "Max_Node" if node["is_max"] else "Min_Node"
+    best_move = "--" if not node["best_move"] else node["best_move"]
+    alpha = format_score(node["alpha"])
+    beta = format_score(node["beta"])
 
-    # filp
-    formatted_lines = formatted_lines[::-1]
+    # return f"{is_max} {remaining_depth} Alpha: {alpha} Beta: {beta} Best: {best_move} Current: {move} {score} Unexplored: {remaining_moves}"
+    return f"{is_max} Alpha: {alpha} Beta: {beta} Best: {best_move} Current: {move} {score} Unexplored:{remaining_moves}"
+
+
+def format_stack(stack):
+    # filp, top of the stack first
+    formatted_lines = [format_stack_line(node) for node in reversed(stack)]
 
     # return "<stack>\n" + "\n".join(formatted_lines) + "\n</stack>"
 
@@ -111,6 +104,34 @@ def format_stack(stack):
     return "<stack>\n" + depth_info + "\n".join(formatted_lines) + "\n</stack>"
 
 
+class StackFormatter:
+    """
+    Same output as `format_stack`, but remembers the line of every node and only re-renders the nodes
+    that changed since the previous call. Usually only the top one or two nodes change between steps.
+    Whoever changes a node sets node["dirty"] = True, nodes without the flag are always rendered.
+    """
+
+    def __init__(self):
+        self.lines = {}  # id(node) -> (node, line)
+
+    def format(self, stack):
+        lines = {}
+        formatted_lines = []
+        for node in reversed(stack):
+            cached = self.lines.get(id(node))
+            if cached is not None and cached[0] is node and not node.get("dirty", True):
+                line = cached[1]
+            else:
+                line = format_stack_line(node)
+                node["dirty"] = False
+            lines[id(node)] = (node, line)
+            formatted_lines.append(line)
+        self.lines = lines
+
+        depth_info = "Remaining_Depth:" + str(stack[-1]["remaining_depth"]) + "\n"
+        return "<stack>\n" + depth_info + "\n".join(formatted_lines) + "\n</stack>"
+
+
 def format_node(node):
     move = node["move"] if node["move"] else "--"
     score = format_score(node["score"]) if node["score"] is not None else "---"
@@ -126,18 +147,9 @@ def format_node(node):
 
 def sort_positions(positions, ascending=True):
     try:
-
-        def get_position_value(pos):
-            col = ord(pos[0]) - ord("a")
-            row = int(pos[1]) - 1
-            return row * 8 + col
-
-        def sort_key(item):
-            pos, score = item
-            score_key = score if ascending else -score
-            return (score_key, get_position_value(pos))
-
-        return sorted(positions, key=sort_key)
+        if ascending:
+            return sorted(positions, key=lambda x: (x[1], SQUARE_INDEX[x[0]]))
+        return sorted(positions, key=lambda x: (-x[1], SQUARE_INDEX[x[0]]))
     except Exception as e:
         print(e)
         print(positions)
@@ -154,4 +166,51 @@ def format_input_moves(input_str):
     pairs = [input_str[i:i+2] for i in range(0, len(input_str), 2)]
     formatted = "  ".join(pairs)
     
-    return f" {formatted} "
\ No newline at end of file
+    return f" {formatted} "
+
+class TextTrace:
+    """
+    Writes a search trace as text through `logger_func`, one call per line.
+    `AlphaBetaEngine.get_best_move` emits the trace through this interface, see token_formatter.TokenTrace for token ids.
+    """
+
+    def __init__(self, logger_func):
+        self.logger_func = logger_func
+        self.stack_formatter = StackFormatter()
+
+    def input(self, board, color, max_width, max_depth, track_moves=False):
+        track_move_flag = "TRACK_ENABLE\n" if track_moves else ""
+        self.logger_func(
+            f"<input>\n{format_board(board)}\n{format_color(color)}\n{format_args(max_width, max_depth)}\n{track_move_flag}</input>\n"
+        )
+
+    def reasoning(self):
+        self.logger_func("<reasoning>")
+
+    def possible_moves(self, moves_list):
+        self.logger_func(f"Possible moves and score:{format_possible_moves(moves_list)}")
+
+    def opponent_possible_moves(self, moves_list):
+        self.logger_func("Possible moves and score:")
+        self.logger_func(f"Opponent possible moves and score:{format_possible_moves(moves_list)}")
+
+    def line(self, text):
+        """Fixed status lines such as "[Updated stack]"."""
+        self.logger_func(text)
+
+    def search_next_node(self):
+        self.logger_func("\n=> Search next node")
+
+    def previous_moves(self, moves):
+        self.logger_func(f"Previous moves:{format_input_moves(moves)}")
+
+    def board(self, board, color):
+        self.logger_func(f"<board>\n{format_board(board)}\n</board>\n{format_color(color)}")
+
+    def stack(self, stack):
+        self.logger_func(self.stack_formatter.format(stack))
+
+    def play(self, move, board):
+        self.logger_func(f"> Playing {move} ")
+        self.logger_func("</reasoning>\n")
+        self.logger_func(f"<output>\n {move} \n{format_board(board)}\n</output>\n")
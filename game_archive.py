@@ -0,0 +1,104 @@
+import os
+import struct
+import numpy as np
+from formatter import SQUARE_NAMES
+from game_logs import GameLogReader
+
+
+MAGIC = b"OTGA"
+HEADER = struct.Struct("<4sQQ")  # magic, game count, total move count
+PASS = 64  # move code of "ps", squares are 0-63 (idx = row * 8 + col)
+MOVE_STRINGS = SQUARE_NAMES + ["ps"]
+
+
+def pack_lines(data: bytes):
+    """
+    Pack the move strings of a game log ("d3c5...\\n" per game) into move codes.
+    Returns (codes uint8, moves per game int64).
+    """
+    chars = np.frombuffer(data, dtype=np.uint8)
+    newlines = np.flatnonzero(chars == ord("\n"))
+    ends = np.append(newlines, len(chars)) if len(chars) and chars[-1] != ord("\n") else newlines
+    lengths = np.diff(np.concatenate([[-1], ends])) - 1  # characters per line without the newline
+    if np.any(lengths % 2):
+        raise ValueError("Every game must have an even number of characters.")
+    pairs = chars[chars != ord("\n")].reshape(-1, 2).astype(np.int16)
+    codes = (pairs[:, 1] - ord("1")) * 8 + (pairs[:, 0] - ord("a"))
+    is_pass = (pairs[:, 0] == ord("p")) & (pairs[:, 1] == ord("s"))
+    codes[is_pass] = PASS
+    valid = (pairs[:, 0] >= ord("a")) & (pairs[:, 0] <= ord("h")) & (pairs[:, 1] >= ord("1")) & (pairs[:, 1] <= ord("8"))
+    if not np.all(valid | is_pass):
+        raise ValueError("Invalid move in game log.")
+    return codes.astype(np.uint8), lengths // 2
+
+
+def pack_game_logs(folder_path, output_path):
+    """
+    Convert the .txt game logs in `folder_path` (in `GameLogReader` order) into one packed archive.
+    File layout: header, move codes (1 byte per move), padding to 8 bytes, (count + 1) uint64 offsets into the codes.
+    """
+    reader = GameLogReader(folder_path)
+    counts = [np.zeros(1, dtype=np.int64)]
+    total = 0
+    with open(output_path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+        for name, *_ in reader.files:
+            with open(os.path.join(folder_path, name), "rb") as log:
+                codes, moves_per_game = pack_lines(log.read())
+            f.write(codes.tobytes())
+            counts.append(moves_per_game)
+            total += len(codes)
+        f.write(b"\0" * (-(HEADER.size + total) % 8))
+        offsets = np.cumsum(np.concatenate(counts)).astype(np.uint64)
+        f.write(offsets.tobytes())
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(offsets) - 1, total))
+    os.replace(output_path + ".tmp", output_path)
+
+
+class GameArchive:
+    """
+    Memory-mapped reader of a file written by `pack_game_logs`. Worker processes that open the same archive
+    share its pages. `read(start, end)` returns move strings like `GameLogReader.read` (without the newline).
+    """
+
+    def __init__(self, path):
+        data = np.memmap(path, mode="r", dtype=np.uint8)
+        magic, self.count, total = HEADER.unpack(bytes(data[: HEADER.size]))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a game archive.")
+        offsets_start = HEADER.size + total + (-(HEADER.size + total) % 8)
+        self.codes = data[HEADER.size : HEADER.size + total]
+        self.offsets = data[offsets_start : offsets_start + (self.count + 1) * 8].view(np.uint64)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def move_counts(self):
+        """Number of moves of every game."""
+        return np.diff(self.offsets).astype(np.int64)
+
+    def game(self, idx):
+        """Move codes of game `idx` as a view into the archive."""
+        return self.codes[self.offsets[idx] : self.offsets[idx + 1]]
+
+    def moves_string(self, idx, num_moves=None):
+        codes = self.game(idx)[:num_moves]
+        return "".join([MOVE_STRINGS[code] for code in codes.tolist()])
+
+    def read(self, start=0, end=None):
+        end = self.count if end is None else min(end, self.count)
+        return [self.moves_string(idx) for idx in range(start, end)]
+
+
+if __name__ == "__main__":
+    import time
+
+    GAME_LOGS_PATH = "./0000_egaroucid_6_3_0_lv11"
+    ARCHIVE_PATH = "./0000_egaroucid_6_3_0_lv11.otga"
+
+    t0 = time.time()
+    pack_game_logs(GAME_LOGS_PATH, ARCHIVE_PATH)
+    archive = GameArchive(ARCHIVE_PATH)
+    print(f"Packed {len(archive)} games ({len(archive.codes)} moves) in {time.time() - t0:.2f}s")
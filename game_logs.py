@@ -0,0 +1,101 @@
+import os
+import json
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class GameLogReader:
+    """
+    Lazy reader of the game logs in `folder_path`, one game per line in every .txt file, files in name order.
+    Games are addressed by their global index. An offset index (line count of every file and the byte offset
+    of every `stride`-th line) lets a range be read with seeks, files before and after it are not read.
+    Building the index takes one pass over the files, it is cached in `index_path` if given and writable.
+    """
+
+    def __init__(self, folder_path, stride=1000, index_path=None):
+        self.folder_path = folder_path
+        self.stride = stride
+        names = sorted(name for name in os.listdir(folder_path) if name.endswith(".txt"))
+        stats = [os.stat(os.path.join(folder_path, name)) for name in names]
+        signature = [[name, stat.st_size, stat.st_mtime_ns] for name, stat in zip(names, stats)]
+
+        self.files = None
+        if index_path and os.path.isfile(index_path):
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:  # unreadable or corrupt, rebuilt below
+                print(f"Ignoring game log index {index_path}: {e}")
+                index = {"stride": None, "files": []}
+            if index["stride"] == stride and [x[:3] for x in index["files"]] == signature:
+                self.files = index["files"]
+        if self.files is None:
+            self.files = [[name, size, mtime, *self._index_file(name)] for name, size, mtime in signature]
+            if index_path:
+                self._save_index(index_path)
+
+        # files[i] = [name, size, mtime, line count, offsets of lines 0, stride, 2 * stride, ...]
+        self.first_game = [0] + list(accumulate(x[3] for x in self.files))
+
+    def _save_index(self, index_path):
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"  # several generators may build it at once
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stride": self.stride, "files": self.files}, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:  # e.g. a read-only dataset, the index is only kept in memory
+            print(f"Could not cache the game log index in {index_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _index_file(self, name):
+        with open(os.path.join(self.folder_path, name), "rb") as f:
+            lines = f.read().split(b"\n")
+        if lines[-1] == b"":  # the file ends with a newline
+            lines.pop()
+        starts = [0] + list(accumulate(len(line) + 1 for line in lines[:-1]))
+        return len(lines), starts[:: self.stride]
+
+    def __len__(self):
+        return self.first_game[-1]
+
+    def iter_games(self, start=0, end=None):
+        """Yield (game index, line) for games start..end-1, lines keep their "\\n" like `read_all_txt_files`."""
+        end = len(self) if end is None else min(end, len(self))
+        idx = max(start, 0)
+        while idx < end:
+            file_idx = bisect_right(self.first_game, idx) - 1
+            name, _, _, count, offsets = self.files[file_idx]
+            local = idx - self.first_game[file_idx]
+            with open(os.path.join(self.folder_path, name), "rb") as f:
+                f.seek(offsets[local // self.stride])
+                for _ in range(local % self.stride):
+                    f.readline()
+                for _ in range(min(count - local, end - idx)):
+                    yield idx, f.readline().decode()
+                    idx += 1
+
+    def read(self, start=0, end=None):
+        return [line for _, line in self.iter_games(start, end)]
+
+    def shard_range(self, worker_id, num_workers, start=0, end=None):
+        """Contiguous part `worker_id` of `num_workers` of the games start..end-1."""
+        end = len(self) if end is None else min(end, len(self))
+        count = max(end - start, 0)
+        return start + count * worker_id // num_workers, start + count * (worker_id + 1) // num_workers
+
+    def iter_shard(self, worker_id, num_workers, start=0, end=None):
+        return self.iter_games(*self.shard_range(worker_id, num_workers, start, end))
+
+
+if __name__ == "__main__":
+    import time
+
+    GAME_LOGS_PATH = "./0000_egaroucid_6_3_0_lv11"
+
+    t0 = time.time()
+    reader = GameLogReader(GAME_LOGS_PATH)
+    print(f"Indexed {len(reader)} games in {len(reader.files)} files in {time.time() - t0:.2f}s")
+    t0 = time.time()
+    games = reader.read(1234567, 1234567 + 1000)
+    print(f"Read {len(games)} games from the middle in {time.time() - t0:.4f}s")
@@ -1,70 +1,388 @@
 import os
+import glob
 import random
+import time
+import traceback
+import multiprocessing as mp
+import numpy as np
 from logger import DataLogger
+from metrics import MetricsReporter, generator_snapshot
+from othello_tokenizer import OTHELLO_TOKENIZER
+from shard_writer import ShardedJsonlWriter
+from binidx import BinidxWriter
+from block_jsonl import BlockCompressedWriter, EXTENSIONS
+from game_logs import GameLogReader
+from game_archive import GameArchive
+from token_formatter import TokenTrace
 from alphabeta_engine import AlphaBetaEngine
-import json
-from queue import Queue
-from concurrent.futures import ThreadPoolExecutor
+from position_table import PositionTable
+from trace_length import TraceLengthEstimator, filter_by_token_budget
+from scheduler import CostModel, longest_first, cost_chunks
+from dedup import dedup_inputs
+from queue import Queue, Empty
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List
 from tqdm import tqdm
 
 
+def prepare_output(paths, writer_class=ShardedJsonlWriter, resume=False, overwrite=False):
+    """
+    Check the output files of the writers on `paths` before generating.
+    resume=True recovers the output of an interrupted run and returns the keys of the samples already done,
+    overwrite=True deletes existing output, otherwise existing output is an error.
+    """
+    if resume:
+        return set().union(*[writer_class.recover(path) for path in paths])
+    existing = [file for path in paths for file in writer_class.existing_files(path)]
+    if existing and not overwrite:
+        raise FileExistsError(f"File {existing[0]} already exists, pass resume=True to continue or overwrite=True.")
+    for path in existing:
+        os.remove(path)
+    return set()
+
+
+def sample_key(game_idx, length, max_width, max_depth, seed):
+    return f"{game_idx}:{length}:{max_width}:{max_depth}:{seed}"
+
+
+def split_ext(path):
+    """data/x.jsonl -> ("data/x", ".jsonl"), compressed outputs keep both extensions: data/x.jsonl.gz -> ("data/x", ".jsonl.gz")"""
+    root, ext = os.path.splitext(path)
+    if ext in EXTENSIONS:
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return root, ext
+
+
+def shard_path(save_path, worker_id):
+    """data/x.jsonl -> data/x_w03.jsonl"""
+    root, ext = split_ext(save_path)
+    return f"{root}_w{worker_id:02d}{ext}"
+
+
+def worker_paths(save_path, pool_size):
+    """Output paths of `pool_size` workers, plus the ones left by a previous run with more workers."""
+    root, ext = split_ext(save_path)
+    previous = glob.glob(f"{glob.escape(root)}_w[0-9][0-9]{ext}.manifest")
+    previous = [path[: -len(".manifest")] for path in previous]
+    paths = [shard_path(save_path, i) for i in range(pool_size)]
+    return paths + sorted(set(previous) - set(paths))
+
+
+def split_input(item):
+    """(moves, width, depth) or (moves, width, depth, key) -> (moves, width, depth, key or None)"""
+    return item[0], item[1], item[2], (item[3] if len(item) > 3 else None)
+
+
 class OthelloGeneratorPool:
-    def __init__(self, engine_class, engine_path: str, level: int, threads: int, pool_size: int, save_path: str):
-        if os.path.exists(save_path):
-            if input(f"File {save_path} already exists. Overwrite? (y/n): ").lower() == "y":
-                os.remove(save_path)
-            else:
-                exit(0)
+    def __init__(
+        self,
+        engine_class,
+        engine_path: str,
+        level: int,
+        threads: int,
+        pool_size: int,
+        save_path: str,
+        engine_kwargs: dict = None,
+        writer_kwargs: dict = None,
+        resume: bool = False,
+        overwrite: bool = False,
+        writer_class=ShardedJsonlWriter,
+        max_in_flight: int = None,
+        metrics_path: str = None,
+        metrics_interval: float = 10.0,
+    ):
+        self.done = prepare_output([save_path], writer_class, resume, overwrite)
         self.save_path = save_path
-        self.generators = [OthelloGenerator(engine_class, engine_path, level, threads) for _ in range(pool_size)]
+        # samples being generated or waiting to be written, bounds the memory held by results
+        self.max_in_flight = max_in_flight or 2 * pool_size
+        self.in_flight = 0
+        self.writer = writer_class(save_path, resume=True, **(writer_kwargs or {}))
+        self.generators = [
+            OthelloGenerator(engine_class, engine_path, level, threads, engine_kwargs, count_tokens=metrics_path is not None)
+            for _ in range(pool_size)
+        ]
+        # see metrics.py, written every `metrics_interval` seconds while generating
+        self.metrics = MetricsReporter(metrics_path, self._collect_metrics, metrics_interval) if metrics_path else None
         self.generator_queue = Queue()
         for gen in self.generators:
             self.generator_queue.put(gen)
         self.pool = ThreadPoolExecutor(max_workers=pool_size)
 
-    def _stream_save_result(self, result):
-        with open(self.save_path, "a", encoding="utf-8") as f:
-            json_line = json.dumps({"text": result}, ensure_ascii=False)
-            f.write(json_line + "\n")
+    def _stream_save_result(self, sample, key=None):
+        self.writer.write(sample, key)
 
     def _generate_sample(self, input_moves: str, max_width: int, max_depth: int) -> str:
         # print(input_moves)
         generator = self.generator_queue.get()
         try:
-            result = generator.gen_one_sample(input_moves, max_width, max_depth)
+            gen_one = getattr(generator, "gen_one_" + self.writer.sample_type)
+            result = gen_one(input_moves, max_width, max_depth)
             return result
         finally:
             self.generator_queue.put(generator)
 
-    def generate_samples_parallel(self, inputs: List[tuple[str, int, int]], timeout: int = 120, batch_size: int = 1000):
-        for i in range(0, len(inputs), batch_size):
-            batch = inputs[i : i + batch_size]
-            # print(batch)
-            futures = [self.pool.submit(self._generate_sample, moves, width, depth) for moves, width, depth in batch]
-
-            for f in tqdm(futures, total=len(futures), desc=f"Generating batch {i//batch_size + 1}"):
-                result = f.result(timeout=timeout)
-                self._stream_save_result(result)
+    def _collect_metrics(self):
+        # inputs are not assigned to a generator before one is free, so there is no per-generator queue here
+        generators = {f"g{i:02d}": gen.snapshot() for i, gen in enumerate(self.generators)}
+        busy = len(self.generators) - self.generator_queue.qsize()
+        return generators, {"in_flight": self.in_flight, "busy": busy, "waiting": max(self.in_flight - busy, 0)}
+
+    def generate_samples_parallel(self, inputs: List[tuple], timeout: int = 120, cost_model=None):
+        """
+        `inputs` are (moves, width, depth) or (moves, width, depth, key), inputs whose key is done are skipped.
+        With a `cost_model` (see scheduler.py) the most expensive inputs are started first. All inputs go through
+        one work queue and results are saved as they complete, so a slow sample only holds up its own generator.
+        At most `max_in_flight` inputs are submitted at a time, a new one only after a result has been written,
+        so a writer that falls behind stalls the generators instead of piling up results.
+        """
+        inputs = [split_input(item) for item in inputs]
+        inputs = [item for item in inputs if item[3] is None or item[3] not in self.done]
+        if cost_model is not None:
+            inputs, _ = longest_first(inputs, cost_model)
+        remaining = iter(inputs)
+        pending = {}
+        if self.metrics is not None:
+            self.metrics.start()
+        try:
+            with tqdm(total=len(inputs), desc="Generating") as progress:
+                while True:
+                    for moves, width, depth, key in islice(remaining, self.max_in_flight - len(pending)):
+                        pending[self.pool.submit(self._generate_sample, moves, width, depth)] = key
+                    self.in_flight = len(pending)
+                    if not pending:
+                        break
+                    finished, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    if not finished:
+                        raise TimeoutError(f"No sample finished in {timeout}s")
+                    for f in finished:
+                        self._stream_save_result(f.result(), pending.pop(f))
+                    progress.update(len(finished))
+        finally:
+            if self.metrics is not None:
+                self.metrics.stop()
+        self.writer.close()
 
     def __del__(self):
-        self.pool.shutdown()
+        if hasattr(self, "pool"):
+            self.pool.shutdown()
+
+
+def _process_worker(
+    worker_id,
+    engine_class,
+    engine_path,
+    level,
+    threads,
+    engine_kwargs,
+    writer_class,
+    writer_kwargs,
+    save_path,
+    task_queue,
+    progress_queue,
+    metrics_interval=None,
+):
+    try:
+        generator = OthelloGenerator(engine_class, engine_path, level, threads, engine_kwargs, count_tokens=metrics_interval is not None)
+        gen_one = getattr(generator, "gen_one_" + writer_class.sample_type)
+        generator.queued = 0
+        last_report = time.monotonic()
+        try:
+            with writer_class(save_path, resume=True, **(writer_kwargs or {})) as writer:
+                while True:
+                    chunk = task_queue.get()
+                    if chunk is None:
+                        break
+                    for i, (moves, width, depth, key) in enumerate(chunk):
+                        generator.queued = len(chunk) - i
+                        writer.write(gen_one(moves, width, depth), key)
+                        if metrics_interval is not None and time.monotonic() - last_report >= min(metrics_interval, 1.0):
+                            generator.queued = len(chunk) - i - 1
+                            progress_queue.put(("metrics", worker_id, generator.snapshot()))
+                            last_report = time.monotonic()
+                    generator.queued = 0
+                    progress_queue.put(("done", worker_id, len(chunk)))
+                    if metrics_interval is not None:
+                        progress_queue.put(("metrics", worker_id, generator.snapshot()))
+        finally:
+            generator.engine.cleanup()
+    except BaseException:
+        progress_queue.put(("error", worker_id, traceback.format_exc()))
+        return
+    progress_queue.put(("exit", worker_id, 0))
+
+
+class OthelloProcessPool:
+    """
+    Same job as `OthelloGeneratorPool`, with one process per generator instead of threads,
+    so replays, formatting and JSON encoding run in parallel as well.
+    Every worker owns its engine and writes its own shard (see `shard_path`),
+    the main process only hands out chunks of inputs and tracks progress.
+    """
+
+    def __init__(
+        self,
+        engine_class,
+        engine_path: str,
+        level: int,
+        threads: int,
+        pool_size: int,
+        save_path: str,
+        engine_kwargs: dict = None,
+        writer_kwargs: dict = None,
+        resume: bool = False,
+        overwrite: bool = False,
+        writer_class=ShardedJsonlWriter,
+        metrics_path: str = None,
+        metrics_interval: float = 10.0,
+    ):
+        self.done = prepare_output(worker_paths(save_path, pool_size), writer_class, resume, overwrite)
+        self.save_paths = [shard_path(save_path, i) for i in range(pool_size)]
+        self.task_queue = mp.Queue()
+        self.progress_queue = mp.Queue()
+        # latest counters sent by every worker, see metrics.py
+        self.metrics = MetricsReporter(metrics_path, self._collect_metrics, metrics_interval) if metrics_path else None
+        self.snapshots = {}
+        self.workers = [
+            mp.Process(
+                target=_process_worker,
+                args=(
+                    i,
+                    engine_class,
+                    engine_path,
+                    level,
+                    threads,
+                    engine_kwargs,
+                    writer_class,
+                    writer_kwargs,
+                    path,
+                    self.task_queue,
+                    self.progress_queue,
+                    metrics_interval if metrics_path else None,
+                ),
+                daemon=True,
+            )
+            for i, path in enumerate(self.save_paths)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def generate_samples_parallel(self, inputs: List[tuple], chunk_size: int = 16, cost_model=None):
+        """
+        `inputs` are (moves, width, depth) or (moves, width, depth, key), inputs whose key is done are skipped.
+        With a `cost_model` the inputs are queued most expensive first, in chunks of about the cost of
+        `chunk_size` average inputs, so the expensive ones are handed out one by one.
+        """
+        inputs = [split_input(item) for item in inputs]
+        inputs = [item for item in inputs if item[3] is None or item[3] not in self.done]
+        if cost_model is not None and inputs:
+            inputs, costs = longest_first(inputs, cost_model)
+            chunks = cost_chunks(inputs, costs, sum(costs) / len(costs) * chunk_size)
+        else:
+            chunks = (inputs[i : i + chunk_size] for i in range(0, len(inputs), chunk_size))
+        for chunk in chunks:
+            self.task_queue.put(chunk)
+        for _ in self.workers:
+            self.task_queue.put(None)
+
+        running = len(self.workers)
+        if self.metrics is not None:
+            self.metrics.start()
+        try:
+            with tqdm(total=len(inputs), desc="Generating") as progress:
+                while running:
+                    try:
+                        kind, worker_id, value = self.progress_queue.get(timeout=5)
+                    except Empty:
+                        dead = [i for i, worker in enumerate(self.workers) if worker.exitcode not in (None, 0)]
+                        if dead:
+                            self.terminate()
+                            raise RuntimeError(f"Worker {dead[0]} died with exit code {self.workers[dead[0]].exitcode}")
+                        continue
+                    if kind == "done":
+                        progress.update(value)
+                    elif kind == "metrics":
+                        self.snapshots[f"w{worker_id:02d}"] = value
+                    elif kind == "exit":
+                        running -= 1
+                    else:
+                        self.terminate()
+                        raise RuntimeError(f"Worker {worker_id} failed:\n{value}")
+        finally:
+            if self.metrics is not None:
+                self.metrics.stop()
+
+        for worker in self.workers:
+            worker.join()
+
+    def _collect_metrics(self):
+        try:
+            queued_chunks = self.task_queue.qsize()
+        except NotImplementedError:  # macOS
+            queued_chunks = -1
+        return dict(sorted(self.snapshots.items())), {"queued_chunks": queued_chunks}
+
+    def terminate(self):
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+
+
+TOKEN_COUNT_EVERY = 16  # text samples tokenized for the token counter, one in this many
 
 
 class OthelloGenerator:
-    def __init__(self, engine_class, engine_path, level, threads):
-        self.engine = engine_class(engine_path, level, threads)
+    def __init__(self, engine_class, engine_path, level, threads, engine_kwargs=None, count_tokens=False):
+        self.engine = engine_class(engine_path, level, threads, **(engine_kwargs or {}))
         self.logger = DataLogger(print_to_console=False)
+        # counters for metrics.py. With count_tokens=True one text sample in TOKEN_COUNT_EVERY is tokenized, the others are
+        # estimated from their spaces (most tokens end with one) at the tokens per space so far. Token samples are exact
+        self.tokenizer = OTHELLO_TOKENIZER() if count_tokens else None
+        self.samples = 0
+        self.tokens = 0
+        self.counted_spaces = 0
+        self.counted_tokens = 0
+        self.queued = None  # samples handed to this worker and not finished yet, only known in the process pool
+
+    def _count_logged_sample(self):
+        self.samples += 1
+        if self.tokenizer is None:
+            return
+        spaces = sum([chunk.count(" ") for chunk in self.logger.chunks])
+        if self.samples % TOKEN_COUNT_EVERY == 1 or TOKEN_COUNT_EVERY == 1:
+            self.counted_spaces += spaces
+            self.counted_tokens += len(self.tokenizer.split(self.logger.log))
+        self.tokens += spaces * self.counted_tokens / max(self.counted_spaces, 1)
+
+    def snapshot(self):
+        return generator_snapshot(self.engine, self.samples, round(self.tokens), self.queued)
 
     def gen_one_sample(self, input_moves, max_width, max_depth):
         self.logger.clear()
         self.engine.get_best_move(input_moves, max_width, max_depth, logger_func=self.logger.log_func)
+        self._count_logged_sample()
         return self.logger.log
 
+    def gen_one_json_line(self, input_moves, max_width, max_depth):
+        """Same sample as `gen_one_sample`, already encoded as a {"text": ...} JSON line."""
+        self.logger.clear()
+        self.engine.get_best_move(input_moves, max_width, max_depth, logger_func=self.logger.log_func)
+        self._count_logged_sample()
+        return self.logger.to_json_line()
+
+    def gen_one_tokens(self, input_moves, max_width, max_depth):
+        """Same sample as `gen_one_sample`, emitted directly as othello_vocab.txt token ids."""
+        trace = TokenTrace()
+        self.engine.get_best_move(input_moves, max_width, max_depth, trace=trace)
+        self.samples += 1
+        self.tokens += len(trace.tokens)
+        return trace.tokens
+
 
 def read_all_txt_files(folder_path):
     all_lines = []
-    for filename in os.listdir(folder_path):
+    for filename in sorted(os.listdir(folder_path)):  # same order as GameLogReader
         if filename.endswith(".txt"):
             file_path = os.path.join(folder_path, filename)
             with open(file_path, "r") as f:
@@ -86,9 +404,14 @@ def read_all_txt_files(folder_path):
 
 
 def sample_game_states(games, sample_per_game, length_weight=0, min_prob=0.01):
+    return [games[game_idx][:length] for game_idx, length in sample_game_lengths(games, sample_per_game, length_weight, min_prob)]
+
+
+def sample_game_lengths(games, sample_per_game, length_weight=0, min_prob=0.01):
+    """Same sampling as `sample_game_states`, returns [(index in games, prefix length), ...] instead of the prefixes."""
     sampled_states = []
 
-    for game in games:
+    for game_idx, game in enumerate(games):
         possible_lengths = list(range(0, len(game) + 1, 2))
         n = min(sample_per_game, len(possible_lengths))
 
@@ -107,13 +430,38 @@ def sample_game_states(games, sample_per_game, length_weight=0, min_prob=0.01):
 
         selected_lengths = sorted(random.choices(population=possible_lengths, weights=normalized_weights, k=n))
 
-        game_samples = [game[:length] for length in selected_lengths]
-        # print("\n".join(game_samples))
-        sampled_states.extend(game_samples)
+        sampled_states.extend([(game_idx, length) for length in selected_lengths])
 
     return sampled_states
 
 
+def sample_game_lengths_np(move_counts, sample_per_game, length_weight=0, min_prob=0.01, rng=None):
+    """
+    Vectorized `sample_game_lengths`, same weights and sampling with replacement, drawn with a NumPy Generator
+    for all games of the same length at once. `move_counts` is the number of moves of every game (len(line) // 2).
+    Returns (game index, prefix length in characters) as int64 arrays, sorted by game then length.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    totals = np.asarray(move_counts, dtype=np.int64) + 1  # number of possible prefix lengths
+    game_parts, length_parts = [], []
+    for total in np.unique(totals):
+        games = np.flatnonzero(totals == total)
+        weights = (1 - length_weight) + length_weight * np.arange(total) / max(total - 1, 1)
+        min_weight = weights.min()
+        if min_weight < min_prob:
+            weights += min_prob - min_weight
+        n = min(sample_per_game, total)
+        picks = rng.choice(total, size=(len(games), n), p=weights / weights.sum())
+        picks.sort(axis=1)
+        game_parts.append(np.repeat(games, n))
+        length_parts.append(picks.ravel() * 2)
+    if not game_parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    game_idx, lengths = np.concatenate(game_parts), np.concatenate(length_parts)
+    order = np.argsort(game_idx, kind="stable")
+    return game_idx[order], lengths[order]
+
+
 def parallel_generate(
     engine_path,
     engine_level,
@@ -126,27 +474,162 @@ def parallel_generate(
     start=0,
     end=None,
     length_weight=1.0,
+    position_table=None,
+    token_budget=None,
+    length_model=None,
+    over_budget="rebucket",
+    pool_type="thread",
+    max_shard_bytes=None,
+    flush_interval=5.0,
+    seed=None,
+    resume=False,
+    overwrite=False,
+    output_format="jsonl",
+    metrics_path=None,
+    metrics_interval=10.0,
+    dedup=None,
+    game_index_path=None,
 ):
-
-    games = read_all_txt_files(game_path)
-    print(f"Loaded {len(games)} games, {sample_per_game} samples per game.")
-    games = games[start:end]
+    """
+    Samples are keyed by (game index, prefix length, width, depth, seed) and recorded in a manifest next to the output,
+    with resume=True a restarted run with the same arguments skips the samples that are already done,
+    which needs a fixed `seed` so the restarted run draws the same samples.
+    output_format="binidx" writes token ids to `<output_file without extension>.bin/.idx` for RWKV-LM instead of JSONL,
+    the process pool writes one pair per worker, see `binidx.merge_binidx`. output_format="jsonl.gz" or "jsonl.xz"
+    writes `<output_file>.gz/.xz` in independently compressed blocks with a block index, see block_jsonl.py.
+    dedup="position" (or "canonical") drops inputs whose position and setting were already drawn, see `dedup.dedup_inputs`.
+    This is off by default since it shifts the sampled game lengths and settings away from the drawn distribution.
+    With `metrics_path` throughput, cache hit rates and engine latency are written to `<metrics_path>.json/.prom`.
+    The offset index of a game log folder is cached in `game_index_path` (default `<game_path>/.index.json`),
+    so later runs only read the files of their game range.
+    """
+    assert seed is not None or not resume, "resume needs a fixed seed"
+    if seed is not None:
+        random.seed(seed)
+
+    if os.path.isfile(game_path):
+        game_logs = GameArchive(game_path)
+    else:
+        game_logs = GameLogReader(game_path, index_path=game_index_path or os.path.join(game_path, ".index.json"))
+    print(f"Found {len(game_logs)} games, {sample_per_game} samples per game.")
+    games = game_logs.read(start, end)
     print(f"Selected {len(games)} games from {start} to {end}.")
-    input_moves = sample_game_states(games, sample_per_game, length_weight)
-    print(f"Sampled {len(input_moves)} states.")
-
-    input_moves = [(move, *random.choice(search_tree_settings)) for move in input_moves]
-
-    generator_pool = OthelloGeneratorPool(
+    game_idx, lengths = sample_game_lengths_np(
+        [len(game) // 2 for game in games], sample_per_game, length_weight, rng=np.random.default_rng(seed)
+    )
+    print(f"Sampled {len(game_idx)} states.")
+
+    input_moves = [
+        (games[idx][:length], *random.choice(search_tree_settings), start + idx, length)
+        for idx, length in zip(game_idx.tolist(), lengths.tolist())
+    ]
+
+    if token_budget:
+        estimator = TraceLengthEstimator.load(length_model) if length_model else TraceLengthEstimator()
+        input_moves = filter_by_token_budget(input_moves, search_tree_settings, estimator, token_budget, over_budget, random)
+
+    if dedup:
+        input_moves = dedup_inputs(input_moves, dedup)
+
+    keyed_inputs = []
+    occurrences = {}
+    for moves, max_width, max_depth, game_idx, length in input_moves:
+        key = sample_key(game_idx, length, max_width, max_depth, seed)
+        occurrences[key] = occurrences.get(key, 0) + 1
+        if occurrences[key] > 1:  # the same state and setting drawn again
+            key += f"#{occurrences[key] - 1}"
+        keyed_inputs.append((moves, max_width, max_depth, key))
+
+    assert output_format in ["jsonl", "binidx", "jsonl.gz", "jsonl.xz"], "Invalid output_format"
+    if output_format == "binidx":
+        save_path = os.path.splitext(output_file)[0]
+        writer_class, writer_kwargs = BinidxWriter, {"flush_interval": flush_interval}
+    elif output_format in ["jsonl.gz", "jsonl.xz"]:
+        save_path = output_file + output_format[len("jsonl") :]
+        writer_class, writer_kwargs = BlockCompressedWriter, {"flush_interval": flush_interval}
+    else:
+        save_path = output_file
+        writer_class, writer_kwargs = ShardedJsonlWriter, {"max_shard_bytes": max_shard_bytes, "flush_interval": flush_interval}
+
+    pool_class = OthelloProcessPool if pool_type == "process" else OthelloGeneratorPool
+    generator_pool = pool_class(
         AlphaBetaEngine,
         engine_path,
         level=engine_level,
         threads=engine_threads,
         pool_size=num_generators,
-        save_path=output_file,
+        save_path=save_path,
+        engine_kwargs={"position_table": position_table},
+        writer_kwargs=writer_kwargs,
+        resume=resume,
+        overwrite=overwrite,
+        writer_class=writer_class,
+        metrics_path=metrics_path,
+        metrics_interval=metrics_interval,
     )
+    if generator_pool.done:
+        print(f"Resuming, {len(generator_pool.done)} samples already done.")
 
-    generator_pool.generate_samples_parallel(input_moves)
+    table_plies = 0
+    if position_table:
+        table = PositionTable(position_table)
+        table_plies = table.max_discs - 4
+        table.close()
+    cost_model = CostModel(table_plies=table_plies)
+    generator_pool.generate_samples_parallel(keyed_inputs, cost_model=cost_model)
+
+
+def coordinated_generate(
+    coordinator_address,
+    engine_path,
+    engine_level,
+    engine_threads,
+    game_path,
+    sample_per_game,
+    output_file,
+    num_generators,
+    search_tree_settings,
+    seed=None,
+    **kwargs,
+):
+    """
+    Run `parallel_generate` on the game ranges leased from a coordinator (see coordinator.py) until all are done,
+    instead of a fixed start/end. Start as many of these as needed on any host. Every lease writes its own output
+    `<output_file>_r<range>_<lease>` (plus the usual worker shard suffixes), the coordinator journal lists the
+    accepted outputs of every range, a range left behind by a dead worker is generated again from scratch.
+    Samples of a range are drawn with a seed derived from its start, so they do not depend on which worker ran it.
+    `kwargs` are passed on to `parallel_generate`, except start, end, resume and overwrite.
+    """
+    from coordinator import CoordinatorClient, run_worker
+
+    root, ext = os.path.splitext(output_file)
+
+    def generate_range(start, end, range_id, lease):
+        range_root = f"{root}_r{range_id:05d}_{lease}"
+        parallel_generate(
+            engine_path,
+            engine_level,
+            engine_threads,
+            game_path,
+            sample_per_game,
+            range_root + ext,
+            num_generators,
+            search_tree_settings,
+            start,
+            end,
+            seed=None if seed is None else seed * 1000003 + start,
+            overwrite=True,
+            **kwargs,
+        )
+        outputs = glob.glob(glob.escape(range_root) + "*")
+        return sorted(path for path in outputs if path.endswith((ext, ".bin", ".idx", ".gz", ".xz")))
+
+    client = CoordinatorClient(*coordinator_address)
+    try:
+        completed = run_worker(client, generate_range)
+    finally:
+        client.close()
+    print(f"No ranges left, {completed} generated by this worker.")
 
 
 def power_pairs(limit, max_x=10, max_y=10):
@@ -155,13 +638,24 @@ def power_pairs(limit, max_x=10, max_y=10):
 
 if __name__ == "__main__":
     ENGINE_PATH = "Egaroucid_for_Console_7_5_1_Windows_SIMD\Egaroucid_for_Console_7_5_1_SIMD.exe"
-    GAME_LOGS_PATH = "./0000_egaroucid_6_3_0_lv11"
+    GAME_LOGS_PATH = "./0000_egaroucid_6_3_0_lv11"  # folder of .txt logs, or an archive packed by game_archive.py
     SAMPLE_PER_GAME = 1
     ENGINE_LEVEL = 5
     ENGINE_THREADS = 12
     NUM_GENERATORS = 10
     RANDOM_SEED = 42
     LENGTH_WEIGHT = 0.9  # higher value means more samples from the end of the games. 0.0 means uniform distribution.
+    POSITION_TABLE = None  # precomputed shallow positions from position_table.py, None to always ask the engine
+    TOKEN_BUDGET = None  # e.g. 16384 (CTX_LEN) to skip or rebucket samples whose trace would not fit, None to keep all
+    LENGTH_MODEL = None  # fitted by trace_length.py, None to use the worst case bound
+    POOL_TYPE = "process"  # "process": one process and output shard per generator, "thread": threads writing OUTPUT_FILE
+    MAX_SHARD_BYTES = 1 << 30  # roll over to numbered shards of at most 1 GiB, None for a single file
+    FLUSH_INTERVAL = 5.0  # seconds between writes of buffered samples
+    RESUME = True  # continue an interrupted run with the same settings, skipping the samples in its manifest
+    OUTPUT_FORMAT = "jsonl"  # "binidx" to write RWKV-LM's .bin/.idx directly, "jsonl.gz"/"jsonl.xz" for block-compressed JSONL
+    METRICS_INTERVAL = 10.0  # seconds between writes of the run metrics next to the output, see metrics.py
+    DEDUP = None  # "position" or "canonical" to skip inputs whose position and setting were already drawn (changes the sampled distribution)
+    COORDINATOR = None  # e.g. ("10.0.0.1", 8765) to take game ranges from coordinator.py instead of START/END
 
     # generate all possible pairs of which node count is less than x.
     MAX_NODE_COUNT = 100
@@ -173,18 +667,53 @@ if __name__ == "__main__":
 
     OUTPUT_FILE = f"data/DEMO_lv{ENGINE_LEVEL}_s{START}_e{END}_p{SAMPLE_PER_GAME}_node{MAX_NODE_COUNT}_seed{RANDOM_SEED}_weight{LENGTH_WEIGHT}.jsonl"
 
-    random.seed(RANDOM_SEED)
-
-    parallel_generate(
-        ENGINE_PATH,
-        ENGINE_LEVEL,
-        ENGINE_THREADS,
-        GAME_LOGS_PATH,
-        SAMPLE_PER_GAME,
-        OUTPUT_FILE,
-        NUM_GENERATORS,
-        SEARCH_TREE_SETTINGS,
-        START,
-        END,
-        LENGTH_WEIGHT,
-    )
+    if COORDINATOR:
+        coordinated_generate(
+            COORDINATOR,
+            ENGINE_PATH,
+            ENGINE_LEVEL,
+            ENGINE_THREADS,
+            GAME_LOGS_PATH,
+            SAMPLE_PER_GAME,
+            OUTPUT_FILE,
+            NUM_GENERATORS,
+            SEARCH_TREE_SETTINGS,
+            seed=RANDOM_SEED,
+            length_weight=LENGTH_WEIGHT,
+            position_table=POSITION_TABLE,
+            token_budget=TOKEN_BUDGET,
+            length_model=LENGTH_MODEL,
+            pool_type=POOL_TYPE,
+            max_shard_bytes=MAX_SHARD_BYTES,
+            flush_interval=FLUSH_INTERVAL,
+            output_format=OUTPUT_FORMAT,
+            metrics_path=os.path.splitext(OUTPUT_FILE)[0] + ".metrics",
+            metrics_interval=METRICS_INTERVAL,
+            dedup=DEDUP,
+        )
+    else:
+        parallel_generate(
+            ENGINE_PATH,
+            ENGINE_LEVEL,
+            ENGINE_THREADS,
+            GAME_LOGS_PATH,
+            SAMPLE_PER_GAME,
+            OUTPUT_FILE,
+            NUM_GENERATORS,
+            SEARCH_TREE_SETTINGS,
+            START,
+            END,
+            LENGTH_WEIGHT,
+            POSITION_TABLE,
+            TOKEN_BUDGET,
+            LENGTH_MODEL,
+            pool_type=POOL_TYPE,
+            max_shard_bytes=MAX_SHARD_BYTES,
+            flush_interval=FLUSH_INTERVAL,
+            seed=RANDOM_SEED,
+            resume=RESUME,
+            output_format=OUTPUT_FORMAT,
+            metrics_path=os.path.splitext(OUTPUT_FILE)[0] + ".metrics",
+            metrics_interval=METRICS_INTERVAL,
+            dedup=DEDUP,
+        )
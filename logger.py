@@ -1,21 +1,39 @@
+from json.encoder import encode_basestring
+
+
+def escape_json(text: str):
+    """JSON string escaping without the quotes, same as json.dumps(text, ensure_ascii=False)[1:-1]."""
+    return encode_basestring(text)[1:-1]
+
+
 class DataLogger:
     def __init__(self, print_to_console=True):
-        self.log = ""
+        self.chunks = []  # joined on demand, repeated string concatenation is quadratic on large traces
         self.print_to_console = print_to_console
 
+    @property
+    def log(self):
+        return "".join(self.chunks)
+
     def log_func(self, text: str, end="\n"):
         if self.print_to_console:
             print(text)
-        self.log += text + end
+        self.chunks.append(text + end)
+
+    def to_json_line(self):
+        """Same as json.dumps({"text": self.log}, ensure_ascii=False) + "\\n", without building the raw text first."""
+        return '{"text": "' + "".join([escape_json(chunk) for chunk in self.chunks]) + '"}\n'
 
     def print_all(self, max_length=2000):
+        log = self.log
         print("=" * 100)
         if max_length is None:
-            print(self.log)
+            print(log)
         else:
-            print(self.log[:max_length])
+            print(log[:max_length])
         print("=" * 100)
-        print(f"Total Length: {len(self.log)}")
+        print(f"Total Length: {len(log)}")
 
     def clear(self):
-        self.log = ""
+        self.chunks = []
+
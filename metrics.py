@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+
+
+LATENCY_BUCKETS = [0.0001 * 2**i for i in range(21)]  # upper bounds in seconds, 0.1 ms .. 105 s
+
+
+class LatencyHistogram:
+    """Counts of latencies in `LATENCY_BUCKETS` (the last count is everything above), mergeable across generators."""
+
+    def __init__(self, counts=None, total=0.0):
+        self.counts = list(counts) if counts else [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = total
+
+    def record(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        return self
+
+    def quantile(self, q):
+        """Interpolated within the bucket, None without samples."""
+        count = self.count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = LATENCY_BUCKETS[i - 1] if i else 0.0
+                high = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1] * 2
+                return low + (high - low) * (rank - seen) / n
+            seen += n
+        return LATENCY_BUCKETS[-1]
+
+    def to_dict(self):
+        return {"counts": self.counts, "sum": self.total}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["counts"], data["sum"])
+
+
+def generator_snapshot(engine, samples, tokens, queued):
+    """Counters of one generator as a plain dict, so worker processes can send it through a queue."""
+    return {
+        "samples": samples,
+        "tokens": tokens,
+        "queued": queued,
+        "engine_calls": engine.call_counts["engine"],
+        "table_hits": engine.call_counts["table"],
+        "endgame_hits": engine.call_counts["endgame"],
+        "move_cache_hits": getattr(engine, "move_cache_hits", 0),
+        "move_cache_lookups": getattr(engine, "move_cache_lookups", 0),
+        "latency": engine.latency.to_dict(),
+    }
+
+
+COUNTERS = ["samples", "tokens", "engine_calls", "table_hits", "endgame_hits", "move_cache_hits", "move_cache_lookups"]
+
+
+class MetricsReporter:
+    """
+    Writes the metrics of a generation run to `<path>.json` and `<path>.prom` (Prometheus text format, e.g. for
+    node_exporter's textfile collector) every `interval` seconds from a background thread.
+    `collect()` returns ({generator name: `generator_snapshot`}, {gauge name: value}), rates are taken between writes.
+    Engine-bound runs show high engine latency with busy generators, Python-bound runs a low engine call share
+    of the wall time, I/O-bound runs a growing queue behind the writer.
+    """
+
+    def __init__(self, path, collect, interval=10.0):
+        self.path = path
+        self.collect = collect
+        self.interval = interval
+        self.start_time = time.monotonic()
+        self.last = None  # (time, totals) of the previous write
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+        self.write()
+
+    def summary(self):
+        generators, gauges = self.collect()
+        now = time.monotonic()
+        totals = {name: sum(g[name] for g in generators.values()) for name in COUNTERS}
+        latency = LatencyHistogram()
+        for g in generators.values():
+            latency.merge(LatencyHistogram.from_dict(g["latency"]))
+        last_time, last_totals = self.last or (self.start_time, dict.fromkeys(COUNTERS, 0))
+        elapsed = max(now - last_time, 1e-9)
+        lookups = totals["engine_calls"] + totals["table_hits"] + totals["endgame_hits"]
+        summary = {
+            "time": time.time(),
+            "elapsed": now - self.start_time,
+            "totals": totals,
+            "samples_per_second": (totals["samples"] - last_totals["samples"]) / elapsed,
+            "tokens_per_second": (totals["tokens"] - last_totals["tokens"]) / elapsed,
+            "engine_calls_per_second": (totals["engine_calls"] - last_totals["engine_calls"]) / elapsed,
+            "table_hit_rate": totals["table_hits"] / lookups if lookups else 0.0,
+            "endgame_hit_rate": totals["endgame_hits"] / lookups if lookups else 0.0,
+            "move_cache_hit_rate": totals["move_cache_hits"] / totals["move_cache_lookups"] if totals["move_cache_lookups"] else 0.0,
+            "engine_latency": {
+                "p50": latency.quantile(0.5),
+                "p95": latency.quantile(0.95),
+                "p99": latency.quantile(0.99),
+                "mean": latency.total / latency.count if latency.count else None,
+            },
+            "engine_time_share": latency.total / max((now - self.start_time) * max(len(generators), 1), 1e-9),
+            "gauges": gauges,
+            "queued": {name: g["queued"] for name, g in generators.items() if g["queued"] is not None},
+        }
+        self.last = (now, totals)
+        return summary, latency, generators
+
+    def write(self):
+        summary, latency, generators = self.summary()
+        self._replace(self.path + ".json", json.dumps(summary, indent=2))
+        self._replace(self.path + ".prom", self._prometheus(summary, latency, generators))
+        return summary
+
+    def _replace(self, path, text):
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+    def _prometheus(self, summary, latency, generators):
+        lines = []
+        for name in COUNTERS:
+            lines.append(f"# TYPE othello_gen_{name}_total counter")
+            lines.extend(f'othello_gen_{name}_total{{generator="{g}"}} {s[name]}' for g, s in generators.items())
+        for name in ["samples_per_second", "tokens_per_second", "engine_calls_per_second", "table_hit_rate", "endgame_hit_rate",
+                     "move_cache_hit_rate", "engine_time_share"]:
+            lines.append(f"# TYPE othello_gen_{name} gauge")
+            lines.append(f"othello_gen_{name} {summary[name]}")
+        if summary["queued"]:
+            lines.append("# TYPE othello_gen_queued gauge")
+            lines.extend(f'othello_gen_queued{{generator="{g}"}} {queued}' for g, queued in summary["queued"].items())
+        for name, value in summary["gauges"].items():
+            lines.append(f"# TYPE othello_gen_{name} gauge")
+            lines.append(f"othello_gen_{name} {value}")
+        lines.append("# TYPE othello_gen_engine_latency_seconds histogram")
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, latency.counts):
+            cumulative += count
+            lines.append(f'othello_gen_engine_latency_seconds_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'othello_gen_engine_latency_seconds_bucket{{le="+Inf"}} {latency.count}')
+        lines.append(f"othello_gen_engine_latency_seconds_sum {latency.total}")
+        lines.append(f"othello_gen_engine_latency_seconds_count {latency.count}")
+        return "\n".join(lines) + "\n"
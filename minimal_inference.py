@@ -5,7 +5,7 @@ os.environ["RWKV_CUDA_ON"] = "0"
 os.environ["RWKV_V7_ON"] = "1"
 
 from rwkv.model import RWKV
-from rwkv.rwkv_tokenizer import TRIE_TOKENIZER
+from othello_tokenizer import OTHELLO_TOKENIZER
 from rwkv.utils import PIPELINE, PIPELINE_ARGS
 
 MODEL_PATH = 'models/rwkv7_othello_26m_L10_D448_extended'
@@ -17,7 +17,7 @@ else:
     from rwkv.model import RWKV
 model = RWKV(model=MODEL_PATH, strategy="cpu fp32")
 pipeline = PIPELINE(model, "rwkv_vocab_v20230424")
-pipeline.tokenizer = TRIE_TOKENIZER("othello_vocab.txt")
+pipeline.tokenizer = OTHELLO_TOKENIZER("othello_vocab.txt")
 gen_args = PIPELINE_ARGS(top_k=1, alpha_frequency=0, alpha_presence=0, token_stop=[0])
 
 # black (●) white (○) empty (·)
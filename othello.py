@@ -10,6 +10,7 @@ class Othello:
 
         self.current_player = 1  # techincally is "current color"
         self.moves = ""
+        self.history = []  # undo records for push/pop
 
     def reset(self):
         self.board = [[0] * 8 for _ in range(8)]
@@ -17,6 +18,7 @@ class Othello:
         self.board[3][4] = self.board[4][3] = 1
         self.current_player = 1
         self.moves = ""
+        self.history = []
 
     def _convert_position(self, pos):
         if len(pos) != 2:
@@ -102,6 +104,41 @@ class Othello:
         self.moves += moves
         return True
 
+    def push(self, move: str):
+        """
+        Play a single move in place and remember how to take it back with `pop`.
+        Passes are handled the same way as in `play`.
+        """
+        pos = self._convert_position(move)
+        if not pos:
+            return False
+        row, col = pos
+        flips = self._get_flips(row, col)
+        if not flips:
+            return False
+
+        player = self.current_player
+        self.board[row][col] = player
+        for flip_row, flip_col in flips:
+            self.board[flip_row][flip_col] = player
+
+        self.current_player = 3 - player
+        if not any(self._get_flips(r, c) for r in range(8) for c in range(8)):
+            self.current_player = player
+
+        self.history.append((row, col, flips, player))
+        self.moves += move.lower()
+        return True
+
+    def pop(self):
+        """Take back the last move played with `push`."""
+        row, col, flips, player = self.history.pop()
+        self.board[row][col] = 0
+        for flip_row, flip_col in flips:
+            self.board[flip_row][flip_col] = 3 - player
+        self.current_player = player
+        self.moves = self.moves[:-2]
+
     def play_from_start(self, moves: str):
         moves = moves.replace("ps", "")
         self.reset()
@@ -0,0 +1,124 @@
+import os
+import re
+from ast import literal_eval
+from itertools import chain
+
+
+VOCAB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "othello_vocab.txt")
+
+
+def load_vocab(path=VOCAB_PATH):
+    """Read othello_vocab.txt into {token string: token id}."""
+    vocab = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            idx = int(line[: line.index(" ")])
+            vocab[literal_eval(line[line.index(" ") : line.rindex(" ")])] = idx
+    return vocab
+
+
+class OTHELLO_TOKENIZER:
+    """
+    Drop-in replacement of `TRIE_TOKENIZER` for othello_vocab.txt, same greedy longest-match split.
+
+    Tokens are grouped by their first character and compiled into one regex,
+    `first char (longest rest | ... | shortest rest)` per group, so the split runs inside the regex engine.
+    `encode` also passes lists of token ids through unchanged, so `PIPELINE.generate` accepts pre-tokenized context.
+    """
+
+    def __init__(self, file_name=VOCAB_PATH):
+        self.token2idx = load_vocab(file_name)
+        self.idx2token = {idx: token for token, idx in self.token2idx.items()}
+
+        dispatch = {}  # first character -> rest of the tokens starting with it
+        for token in self.token2idx:
+            dispatch.setdefault(token[0], []).append(token[1:])
+        branches = []
+        for first_char in sorted(dispatch, key=lambda ch: min(self.token2idx[ch + rest] for rest in dispatch[ch])):
+            rests = sorted(dispatch[first_char], key=len, reverse=True)  # longest first, "" (the char alone) last
+            if rests == [""]:
+                branches.append(re.escape(first_char))
+            else:
+                branches.append(re.escape(first_char) + "(?:" + "|".join(re.escape(rest) for rest in rests) + ")")
+        self.pattern = re.compile("|".join(branches))
+
+    def split(self, src: str):
+        pieces = self.pattern.findall(src)
+        if sum(map(len, pieces)) != len(src):
+            raise ValueError("Text contains characters outside of the vocab.")
+        return pieces
+
+    def encode(self, src):
+        if not isinstance(src, str):
+            return list(src)
+        return list(map(self.token2idx.__getitem__, self.split(src)))
+
+    def encode_batch(self, docs):
+        """
+        Encode many documents at once.
+        Returns (tokens, offsets) as NumPy arrays, document i is tokens[offsets[i]:offsets[i + 1]].
+        """
+        import numpy as np
+
+        pieces = [self.split(doc) for doc in docs]
+        offsets = np.zeros(len(pieces) + 1, dtype=np.int64)
+        np.cumsum([len(x) for x in pieces], out=offsets[1:])
+        tokens = np.fromiter(map(self.token2idx.__getitem__, chain.from_iterable(pieces)), dtype=np.uint16, count=int(offsets[-1]))
+        return tokens, offsets
+
+    def decode(self, tokens):
+        try:
+            return "".join([self.idx2token[int(i)] for i in tokens])
+        except KeyError:
+            return "�"  # same as TRIE_TOKENIZER for ids outside of the vocab
+
+    def stream_decoder(self):
+        return StreamDecoder(self.idx2token)
+
+
+class StreamDecoder:
+    """Incremental decoding of a growing token stream, `push` returns the text of the new tokens."""
+
+    def __init__(self, idx2token):
+        self.idx2token = idx2token
+        self.chunks = []
+        self.token_count = 0
+
+    def push(self, tokens):
+        text = "".join([self.idx2token[int(i)] for i in tokens])
+        self.chunks.append(text)
+        self.token_count += len(tokens)
+        return text
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+
+def verify_against_trie(jsonl_paths, file_name=VOCAB_PATH, max_samples=None):
+    """Check `OTHELLO_TOKENIZER` against `TRIE_TOKENIZER` on the "text" of JSONL samples. Returns the number of mismatches."""
+    import json
+    from rwkv.rwkv_tokenizer import TRIE_TOKENIZER
+    from block_jsonl import iter_jsonl
+
+    tokenizer = OTHELLO_TOKENIZER(file_name)
+    reference = TRIE_TOKENIZER(file_name)
+    checked = mismatches = 0
+    for path in jsonl_paths:
+        for line in iter_jsonl(path):
+            text = json.loads(line)["text"]
+            tokens = tokenizer.encode(text)
+            if tokens != reference.encode(text) or tokenizer.decode(tokens) != text:
+                mismatches += 1
+            checked += 1
+            if max_samples and checked >= max_samples:
+                return mismatches
+    return mismatches
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python othello_tokenizer.py data/a.jsonl data/b.jsonl ...
+    mismatches = verify_against_trie(sys.argv[1:])
+    print(f"{mismatches} mismatches against TRIE_TOKENIZER.")
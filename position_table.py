@@ -0,0 +1,209 @@
+import os
+import mmap
+import struct
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from othello import Othello
+from formatter import SQUARE_NAMES, SQUARE_INDEX
+
+
+MAGIC = b"OTPT"
+HEADER = struct.Struct("<4sII")  # magic, position count, max discs on board
+KEY_SIZE = 16  # player bitboard + opponent bitboard, big endian so byte order == numeric order
+
+
+def _build_symmetries():
+    transforms = [
+        lambda r, c: (r, c),
+        lambda r, c: (c, 7 - r),
+        lambda r, c: (7 - r, 7 - c),
+        lambda r, c: (7 - c, r),
+        lambda r, c: (r, 7 - c),
+        lambda r, c: (7 - r, c),
+        lambda r, c: (c, r),
+        lambda r, c: (7 - c, 7 - r),
+    ]
+    symmetries = []
+    for transform in transforms:
+        perm = []
+        for idx in range(64):
+            row, col = transform(*divmod(idx, 8))
+            perm.append(row * 8 + col)
+        symmetries.append(perm)
+    return symmetries
+
+
+SYMMETRIES = _build_symmetries()  # SYMMETRIES[t][idx] = square idx is mapped to under transform t
+INVERSE_SYMMETRIES = [[perm.index(idx) for idx in range(64)] for perm in SYMMETRIES]
+
+
+def canonical_position(board, player):
+    """
+    Reduce a position by the 8 board symmetries.
+    Returns (key, transform), `key` is the smallest (player, opponent) bitboard pair over all symmetries
+    as KEY_SIZE bytes, and `transform` is the symmetry that maps the board onto it.
+    """
+    own, other = [], []
+    for row in range(8):
+        for col in range(8):
+            cell = board[row][col]
+            if cell == player:
+                own.append(row * 8 + col)
+            elif cell:
+                other.append(row * 8 + col)
+
+    best = None
+    for transform, perm in enumerate(SYMMETRIES):
+        p = sum(1 << perm[idx] for idx in own)
+        o = sum(1 << perm[idx] for idx in other)
+        if best is None or (p, o) < best[0]:
+            best = ((p, o), transform)
+    (p, o), transform = best
+    return p.to_bytes(8, "big") + o.to_bytes(8, "big"), transform
+
+
+class PositionTable:
+    """
+    Read-only lookup table of precomputed `hint 64` results, memory-mapped from a file written by `build_position_table`.
+
+    File layout: header, sorted position keys, (count + 1) uint32 offsets into the moves section,
+    moves section of (square uint8, score int8) pairs in canonical orientation.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.max_discs = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a position table.")
+        self.keys_start = HEADER.size
+        self.offsets_start = self.keys_start + self.count * KEY_SIZE
+        self.moves_start = self.offsets_start + (self.count + 1) * 4
+        self.game = Othello()
+
+    def _find(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self.keys_start + mid * KEY_SIZE
+            mid_key = self.mm[start : start + KEY_SIZE]
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def lookup(self, moves: str):
+        """Return the stored moves and scores of the position in `get_moves` format, or None if not in the table."""
+        moves = moves.replace("ps", "")
+        if 4 + len(moves) // 2 > self.max_discs:
+            return None
+        if not self.game.play_from_start(moves):
+            return None
+        key, transform = canonical_position(self.game.board, self.game.current_player)
+        idx = self._find(key)
+        if idx is None:
+            return None
+        start, end = struct.unpack_from("<II", self.mm, self.offsets_start + idx * 4)
+        inverse = INVERSE_SYMMETRIES[transform]
+        data = self.mm[self.moves_start + start * 2 : self.moves_start + end * 2]
+        return [(SQUARE_NAMES[inverse[square]], float(score)) for square, score in struct.iter_unpack("<Bb", data)]
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+def enumerate_positions(start_lines, plies):
+    """
+    Collect every position reachable within `plies` moves of the given move sequences, reduced by symmetry.
+    Returns {canonical key: (moves of one representative, transform)}, end game states are skipped.
+    """
+    positions = {}
+    game = Othello()
+
+    def visit(remaining):
+        legal_moves = game.get_legal_moves()
+        if not legal_moves:
+            return
+        key, transform = canonical_position(game.board, game.current_player)
+        if key not in positions:
+            positions[key] = (game.get_moves(), transform)
+        if remaining == 0:
+            return
+        for move in legal_moves:
+            game.push(move)
+            visit(remaining - 1)
+            game.pop()
+
+    for line in tqdm(start_lines, desc="Enumerating positions"):
+        if game.play_from_start(line):
+            visit(plies)
+    return positions
+
+
+def build_position_table(engine_path, level, threads, num_engines, opening_path, plies, output_path):
+    """
+    Evaluate all positions within `plies` moves of the initial position and of every opening with `hint 64`,
+    then write them as a `PositionTable` file.
+    """
+    from engine import OthelloEngine
+
+    with open(opening_path, "r", encoding="utf-8") as f:
+        openings = [x.strip() for x in f.readlines() if x.strip()]
+    positions = enumerate_positions([""] + openings, plies)
+    print(f"Found {len(positions)} unique positions within {plies} plies of {len(openings)} openings.")
+
+    engines = Queue()
+    for _ in range(num_engines):
+        engines.put(OthelloEngine(engine_path, level, threads, endgame_empties=0))
+
+    def evaluate(item):
+        key, (moves, transform) = item
+        engine = engines.get()
+        try:
+            possible_moves = engine.get_moves(moves)
+        finally:
+            engines.put(engine)
+        perm = SYMMETRIES[transform]
+        possible_moves = [(perm[SQUARE_INDEX[pos]], round(score)) for pos, score in possible_moves if pos in SQUARE_INDEX]
+        return key, possible_moves
+
+    with ThreadPoolExecutor(max_workers=num_engines) as pool:
+        results = list(tqdm(pool.map(evaluate, positions.items()), total=len(positions), desc="Evaluating positions"))
+
+    while not engines.empty():
+        engines.get().cleanup()
+
+    results.sort(key=lambda x: x[0])
+    max_discs = max(4 + len(moves) // 2 for moves, _ in positions.values())
+    offsets = [0]
+    for _, possible_moves in results:
+        offsets.append(offsets[-1] + len(possible_moves))
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    temp_path = output_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(results), max_discs))
+        f.write(b"".join(key for key, _ in results))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        for _, possible_moves in results:
+            f.write(b"".join(struct.pack("<Bb", square, score) for square, score in possible_moves))
+    os.replace(temp_path, output_path)
+    print(f"Saved {len(results)} positions to {output_path}.")
+
+
+if __name__ == "__main__":
+    ENGINE_PATH = "Egaroucid_for_Console_7_5_1_Windows_SIMD\Egaroucid_for_Console_7_5_1_SIMD.exe"
+    ENGINE_LEVEL = 5
+    ENGINE_THREADS = 2
+    NUM_ENGINES = 10
+    OPENING_PATH = "opening.txt"
+    PLIES = 2
+
+    OUTPUT_FILE = f"data/position_table_lv{ENGINE_LEVEL}_ply{PLIES}.bin"
+
+    build_position_table(ENGINE_PATH, ENGINE_LEVEL, ENGINE_THREADS, NUM_ENGINES, OPENING_PATH, PLIES, OUTPUT_FILE)
@@ -4,14 +4,20 @@ os.environ["RWKV_JIT_ON"] = "1"
 os.environ["RWKV_CUDA_ON"] = "0"
 os.environ["RWKV_V7_ON"] = "1"
 
-from rwkv.rwkv_tokenizer import TRIE_TOKENIZER
 from rwkv.utils import PIPELINE, PIPELINE_ARGS
 from othello import Othello
 from formatter import *
+from token_formatter import input_tokens
+from othello_tokenizer import OTHELLO_TOKENIZER
+from trace_parser import TraceParser
+
+
+class StopGeneration(Exception):
+    pass
 
 
 class RWKVEngine:
-    def __init__(self, path, print_output=False, max_width=1, max_depth=1, rwkv_version=None):
+    def __init__(self, path, print_output=False, max_width=1, max_depth=1, rwkv_version=None, stop_at_move=False):
         assert max_width in list(range(1, 11)) and max_depth in list(range(1, 11)), "Invalid max_width or max_depth"
         self.max_width = max_width
         self.max_depth = max_depth
@@ -24,10 +30,12 @@ class RWKVEngine:
         else:
             raise ValueError("Invalid rwkv_version")
         self.pipeline = PIPELINE(self.model, "rwkv_vocab_v20230424")
-        self.pipeline.tokenizer = TRIE_TOKENIZER("othello_vocab.txt")
+        self.pipeline.tokenizer = OTHELLO_TOKENIZER("othello_vocab.txt")
         self.gen_args = PIPELINE_ARGS(top_k=1, alpha_frequency=0, alpha_presence=0, token_stop=[0])
         self.game = Othello()
         self.print_output = print_output
+        self.stop_at_move = stop_at_move  # stop generating once the <output> move is known, skips the output board
+        self.parser = None
         self.leagal_moves = [f'{x}{y}' for x in ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'] for y in range(1, 9)]
         
         self.token_counts = 0
@@ -37,6 +45,11 @@ class RWKVEngine:
         if self.print_output:
             print(x, end='', flush=True)
         self.token_counts += 1
+        self.parser.feed(x)
+
+    def on_move(self, move):
+        if self.stop_at_move:
+            raise StopGeneration
         
     def clear_counts(self):
         self.token_counts = 0
@@ -50,16 +63,18 @@ class RWKVEngine:
 
     def get_best_move(self, input_moves, max_token_count=1000000):
         self.game.play_from_start(input_moves)
-        input_str = (
-            f"<input>\n{format_board(self.game.board)}\n{format_color(self.game.current_player)}\n{format_args(self.max_width, self.max_depth)}\n</input>\n\n"
-        )
+        input_ids = input_tokens(self.game.board, self.game.current_player, self.max_width, self.max_depth)
         if self.print_output:
-            print(f'{" Model input ":-^100}\n{input_str}\n{" Model output ":-^100}')
+            print(f'{" Model input ":-^100}\n{self.pipeline.decode(input_ids)}\n{" Model output ":-^100}')
         self.gen_counts += 1
-        result = self.pipeline.generate(input_str, token_count=max_token_count, args=self.gen_args, callback=self.callback)
-            
-        result = result.split('<output>')[-1].strip()
-        result = result.split('\n')[0].strip()
+        self.parser = TraceParser(on_move=self.on_move)
+        try:
+            self.pipeline.generate(input_ids, token_count=max_token_count, args=self.gen_args, callback=self.callback)
+        except StopGeneration:
+            pass
+        self.parser.close()
+
+        result = self.parser.move
         result = result if result in self.leagal_moves else 'er'
             
         return result
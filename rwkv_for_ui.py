@@ -1,4 +1,7 @@
 from formatter import *
+from token_formatter import input_tokens
+from othello_tokenizer import OTHELLO_TOKENIZER
+from trace_parser import TraceParser
 
 
 MODEL_PATH = "models/rwkv7_othello_26m_L10_D448_extended"
@@ -17,19 +20,20 @@ class OthelloAI:
             from rwkv_extended import RWKV
         else:
             from rwkv.model import RWKV
-        from rwkv.rwkv_tokenizer import TRIE_TOKENIZER
         from rwkv.utils import PIPELINE, PIPELINE_ARGS
         
         # self.model = RWKV(model=model_path, strategy="cuda fp16")
         self.model = RWKV(model=model_path, strategy="cpu fp32")
         self.pipeline = PIPELINE(self.model, "rwkv_vocab_v20230424")
-        self.pipeline.tokenizer = TRIE_TOKENIZER("othello_vocab.txt")
+        self.pipeline.tokenizer = OTHELLO_TOKENIZER("othello_vocab.txt")
         self.gen_args = PIPELINE_ARGS(top_k=1, alpha_frequency=0, alpha_presence=0, token_stop=[0])
         self.callback = None
+        self.parser = None
         self.token_count = 0
 
     def callback_wrapper(self, model_output: str):
         self.token_count += 1
+        self.parser.feed(model_output)
         self.callback({"type": "reasoning", "text": model_output, "token_count": self.token_count})
         # print(model_output, end="", flush=True)
 
@@ -45,30 +49,28 @@ class OthelloAI:
         else:
             self.gen_args.top_p = search_config['top_p']
             self.gen_args.top_k = 0
-        input_str = f"<input>\n{format_board(board_state)}\n{format_color(current_player)}\n{format_args(search_config['breadth'], search_config['depth'])}\n</input>\n\n"
-        # print(input_str)
-        callback({"type": "reasoning", "text": input_str, "token_count": self.token_count})
+        input_ids = input_tokens(board_state, current_player, search_config["breadth"], search_config["depth"])
+        # print(self.pipeline.decode(input_ids))
+        callback({"type": "reasoning", "text": self.pipeline.decode(input_ids), "token_count": self.token_count})
 
-        result_str = self.pipeline.generate(input_str, token_count=5000000, args=self.gen_args, callback=self.callback_wrapper)
+        self.parser = TraceParser()
+        self.pipeline.generate(input_ids, token_count=5000000, args=self.gen_args, callback=self.callback_wrapper)
+        self.parser.close()
 
         self.token_count = 0
 
-        move = result_str.split("<output>")[-1].strip()
-        move = move.split("\n")[0].strip()
-
-        if search_config["depth"] == 1 or search_config["breadth"] == 1:
-            score = int(result_str.split(move)[1][1:4])
-        else:
-            score = int(result_str.split("Alpha")[-1][2:5])
+        move = self.parser.move
+        score = self.parser.score
         print(f"AI move: {move}, score: {score}")
 
-        callback(
-            {
-                "type": "evaluation",
-                "player": current_player,
-                "score": score,
-            }
-        )
+        if score is not None:  # no score when the model found no legal move
+            callback(
+                {
+                    "type": "evaluation",
+                    "player": current_player,
+                    "score": score,
+                }
+            )
 
         self.thinking = False
         return move
@@ -0,0 +1,49 @@
+from trace_length import count_empties, worst_case_tokens
+
+
+# rough relative costs, one engine call (Egaroucid hint) is the unit
+ENGINE_CALL_COST = 1.0
+LOCAL_CALL_COST = 0.05  # answered by the endgame solver or the position table
+TOKEN_COST = 0.002  # Python side: replays, formatting and encoding per trace token
+
+
+class CostModel:
+    """
+    Estimate the cost of generating one sample from its width, depth and empties before running it.
+    Nodes at search depth k get `max_width ** k` engine calls; calls on positions that the engine answers
+    without the subprocess (at most `endgame_empties` empties, or within `table_plies` moves of the start
+    when a position table is loaded) are counted as cheap.
+    """
+
+    def __init__(self, endgame_empties=6, table_plies=0):
+        self.endgame_empties = endgame_empties
+        self.table_plies = table_plies
+
+    def __call__(self, moves, max_width, max_depth):
+        empties = count_empties(moves)
+        cost = worst_case_tokens(empties, max_width, max_depth) * TOKEN_COST
+        levels = 1 if max_width == 1 or max_depth == 1 else max_depth
+        for k in range(levels):
+            local = empties - k <= self.endgame_empties or 60 - empties + k <= self.table_plies
+            cost += max_width**k * (LOCAL_CALL_COST if local else ENGINE_CALL_COST)
+        return cost
+
+
+def longest_first(inputs, cost_model):
+    """Sort inputs by estimated cost, most expensive first, so no long task is left for the end of the run."""
+    costs = [cost_model(item[0], item[1], item[2]) for item in inputs]
+    order = sorted(range(len(inputs)), key=lambda i: -costs[i])
+    return [inputs[i] for i in order], [costs[i] for i in order]
+
+
+def cost_chunks(inputs, costs, target_cost):
+    """Group consecutive inputs into chunks of about `target_cost`, expensive inputs end up alone in their chunk."""
+    chunk, chunk_cost = [], 0.0
+    for item, cost in zip(inputs, costs):
+        chunk.append(item)
+        chunk_cost += cost
+        if chunk_cost >= target_cost:
+            yield chunk
+            chunk, chunk_cost = [], 0.0
+    if chunk:
+        yield chunk
@@ -0,0 +1,168 @@
+import os
+import glob
+import json
+import time
+
+
+def shard_name(path, index):
+    """data/x.jsonl -> data/x.00003.jsonl"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index:05d}{ext}"
+
+
+def existing_shards(path, suffix=""):
+    """Finished files of a writer on `path`: the file itself and its numbered shards. suffix=".tmp" for unfinished ones."""
+    root, ext = os.path.splitext(path)
+    paths = sorted(glob.glob(f"{glob.escape(root)}.[0-9][0-9][0-9][0-9][0-9]{ext}{suffix}"))
+    return ([path + suffix] if os.path.exists(path + suffix) else []) + paths
+
+
+def manifest_path(path):
+    return path + ".manifest"
+
+
+def read_manifest(path):
+    """
+    Entries of the manifest of a writer on `path`: {"file": finished name, "bytes": file size, "done": [keys]},
+    one per flush. A torn last line (crash while writing it) is ignored.
+    """
+    entries = []
+    if os.path.exists(manifest_path(path)):
+        with open(manifest_path(path), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    return entries
+
+
+def recover_output(path):
+    """
+    Bring the output of an interrupted writer on `path` back to the state recorded in its manifest:
+    the unfinished .tmp file is cut back to the last flushed size, dropping samples that were written
+    but never recorded, and renamed to its final name. Returns the keys of all recorded samples.
+    """
+    entries = read_manifest(path)
+    last = entries[-1] if entries else {"file": None, "bytes": 0}
+    for tmp_path in existing_shards(path, ".tmp"):
+        if tmp_path == f"{last['file']}.tmp" and last["bytes"]:
+            with open(tmp_path, "r+b") as f:
+                f.truncate(last["bytes"])
+            os.replace(tmp_path, last["file"])
+        else:  # nothing of it was recorded
+            os.remove(tmp_path)
+    return {key for entry in entries for key in entry["done"]}
+
+
+class ShardedJsonlWriter:
+    """
+    Keeps the output file open and writes lines in batches, flushed every `flush_bytes` or `flush_interval` seconds.
+    With `max_shard_bytes` the output rolls over to numbered shards (see `shard_name`), otherwise everything goes to `path`.
+    Every file is written as `<name>.tmp` and renamed when it is finished, so a partially written shard never appears.
+
+    Lines written with a `key` are recorded in `<path>.manifest` after every flush, together with the file size.
+    `resume=True` recovers the output of an interrupted run (see `recover_output`) and continues after it,
+    `done` then holds the keys that are already in the output.
+    """
+
+    sample_type = "json_line"  # what `write` takes, see `OthelloGenerator.gen_one_json_line`
+
+    def __init__(self, path, max_shard_bytes=None, flush_bytes=1 << 20, flush_interval=5.0, resume=False):
+        self.path = path
+        self.max_shard_bytes = max_shard_bytes
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.shard_index = 0
+        self.paths = []  # finished files
+        self.file = None
+        self.file_path = None
+        self.file_bytes = 0
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_keys = []
+        self.last_flush = time.monotonic()
+        self.manifest = None
+        self.resume = resume
+        self.done = recover_output(path) if resume else set()
+        if resume:
+            self.shard_index = len([x for x in existing_shards(path) if x != path])
+        if not resume and os.path.exists(manifest_path(path)):
+            os.remove(manifest_path(path))
+
+    def _open(self):
+        self.file_path = shard_name(self.path, self.shard_index) if self.max_shard_bytes else self.path
+        self.file_bytes = 0
+        if self.resume and not self.max_shard_bytes and os.path.exists(self.file_path):  # continue the single file
+            os.replace(self.file_path, self.file_path + ".tmp")
+            self.file_bytes = os.path.getsize(self.file_path + ".tmp")
+        self.file = open(self.file_path + ".tmp", "ab" if self.file_bytes else "wb")
+        self.shard_index += 1
+
+    def _finish(self):
+        self.flush()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        if self.file_bytes:
+            os.replace(self.file_path + ".tmp", self.file_path)
+            self.paths.append(self.file_path)
+        else:
+            os.remove(self.file_path + ".tmp")
+        self.file = None
+
+    def write(self, line: str, key=None):
+        data = line.encode("utf-8")
+        if self.file is None:
+            self._open()
+        elif self.max_shard_bytes:
+            shard_bytes = self.file_bytes + self.buffer_bytes
+            if shard_bytes and shard_bytes + len(data) > self.max_shard_bytes:
+                self._finish()
+                self._open()
+        self.buffer.append(data)
+        self.buffer_bytes += len(data)
+        if key is not None:
+            self.buffer_keys.append(key)
+        if self.buffer_bytes >= self.flush_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(b"".join(self.buffer))
+            self.file_bytes += self.buffer_bytes
+            self.buffer = []
+            self.buffer_bytes = 0
+        if self.buffer_keys:
+            # the samples have to reach the file before they are recorded as done
+            self.file.flush()
+            if self.manifest is None:
+                self.manifest = open(manifest_path(self.path), "a", encoding="utf-8")
+            entry = {"file": self.file_path, "bytes": self.file_bytes, "done": self.buffer_keys}
+            self.manifest.write(json.dumps(entry) + "\n")
+            self.manifest.flush()
+            self.done.update(self.buffer_keys)
+            self.buffer_keys = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self._finish()
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest = None
+
+    @staticmethod
+    def recover(path):
+        return recover_output(path)
+
+    @staticmethod
+    def existing_files(path):
+        files = existing_shards(path) + existing_shards(path, ".tmp")
+        return files + ([manifest_path(path)] if os.path.exists(manifest_path(path)) else [])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import multiprocessing as mp
+import numpy as np
+from binidx import BinidxReader, write_index, merge_binidx
+from block_jsonl import BlockCompressedWriter, codec_of, iter_jsonl
+from shard_writer import shard_name
+
+
+# spill metadata of one sample: global id (input << 40 | index in the input) and byte length
+META = np.dtype([("id", "<u8"), ("bytes", "<u8")])
+COMPRESSION_RATIO = 15  # rough size ratio of block-compressed JSONL, only used to pick the bucket count
+
+
+def _iter_samples(fmt, path):
+    """Samples of an input as bytes: JSON lines, or the uint16 tokens of binidx documents."""
+    if fmt == "jsonl":
+        for line in iter_jsonl(path):
+            yield line.encode("utf-8")
+    else:
+        reader = BinidxReader(path)
+        for idx in range(len(reader)):
+            yield reader[idx].tobytes()
+
+
+def _scatter(args):
+    """Pass 1 for one group of inputs: append every sample to a random bucket piece of this worker."""
+    fmt, inputs, num_buckets, seed, spill_dir, worker_id, buffer_bytes = args
+    buffers = [[] for _ in range(num_buckets)]
+    metas = [[] for _ in range(num_buckets)]
+    buffered = 0
+
+    def spill():
+        for bucket in range(num_buckets):
+            if buffers[bucket]:
+                piece = os.path.join(spill_dir, f"b{bucket:05d}_w{worker_id:03d}")
+                with open(piece + ".data", "ab") as f:
+                    f.write(b"".join(buffers[bucket]))
+                with open(piece + ".meta", "ab") as f:
+                    f.write(np.array(metas[bucket], dtype=META).tobytes())
+                buffers[bucket].clear()
+                metas[bucket].clear()
+
+    for input_idx, path in inputs:
+        rng = np.random.default_rng([seed, input_idx])
+        buckets = np.zeros(0, dtype=np.int64)
+        for idx, sample in enumerate(_iter_samples(fmt, path)):
+            if idx % 65536 == 0:
+                buckets = rng.integers(num_buckets, size=65536)
+            bucket = buckets[idx % 65536]
+            buffers[bucket].append(sample)
+            metas[bucket].append(((input_idx << 40) | idx, len(sample)))
+            buffered += len(sample)
+            if buffered >= buffer_bytes:
+                spill()
+                buffered = 0
+    spill()
+
+
+def _gather(args):
+    """Pass 2 for one bucket: load its pieces, put the samples in input order, then in a random order, and write them."""
+    fmt, bucket, num_workers, seed, spill_dir, output_path = args
+    data, metas = [], []
+    for worker_id in range(num_workers):
+        piece = os.path.join(spill_dir, f"b{bucket:05d}_w{worker_id:03d}")
+        if os.path.exists(piece + ".meta"):
+            metas.append(np.fromfile(piece + ".meta", dtype=META))
+            with open(piece + ".data", "rb") as f:
+                data.append(f.read())
+    meta = np.concatenate(metas) if metas else np.zeros(0, dtype=META)
+    data = b"".join(data)
+    starts = np.zeros(len(meta) + 1, dtype=np.int64)
+    np.cumsum(meta["bytes"], out=starts[1:])
+    # sorting by id first makes the result independent of the number of workers
+    order = np.argsort(meta["id"], kind="stable")[np.random.default_rng([seed, bucket, 1]).permutation(len(meta))]
+
+    if fmt == "binidx":
+        tokens = np.frombuffer(data, dtype=np.uint16)
+        with open(output_path + ".bin.tmp", "wb") as f:
+            for i in order.tolist():
+                f.write(tokens[starts[i] // 2 : starts[i + 1] // 2].tobytes())
+        write_index(output_path + ".idx.tmp", meta["bytes"][order] // 2)
+        os.replace(output_path + ".bin.tmp", output_path + ".bin")
+        os.replace(output_path + ".idx.tmp", output_path + ".idx")
+    elif codec_of(output_path):
+        with BlockCompressedWriter(output_path, flush_interval=float("inf")) as writer:
+            for i in order.tolist():
+                writer.write(data[starts[i] : starts[i + 1]].decode("utf-8"))
+    else:
+        with open(output_path + ".tmp", "wb") as f:
+            for i in order.tolist():
+                f.write(data[starts[i] : starts[i + 1]])
+        os.replace(output_path + ".tmp", output_path)
+    return len(order)
+
+
+def external_shuffle(fmt, inputs, output_path, seed=0, bucket_bytes=1 << 30, num_buckets=None, num_workers=None, spill_dir=None):
+    """
+    Two-pass external shuffle: pass 1 sends every sample to a uniformly random bucket (inputs in parallel),
+    pass 2 shuffles each bucket in memory and writes it as its own shard (buckets in parallel). The shards in order
+    are a uniform random permutation of all samples. Memory per worker is about one bucket (`bucket_bytes`).
+    The result only depends on the inputs, `seed` and the bucket count, not on the number of workers.
+    fmt="jsonl": `inputs` are JSONL files (plain or block-compressed), shards `shard_name(output_path, k)`.
+    fmt="binidx": `inputs` are binidx prefixes, shards `<output_path>.<k>.bin/.idx`.
+    Returns the shard paths (prefixes for binidx).
+    """
+    assert fmt in ["jsonl", "binidx"], "Invalid format"
+    num_workers = num_workers or os.cpu_count()
+    if num_buckets is None:
+        if fmt == "binidx":
+            total = sum(os.path.getsize(prefix + ".bin") for prefix in inputs)
+        else:
+            total = sum(os.path.getsize(path) * (COMPRESSION_RATIO if codec_of(path) else 1) for path in inputs)
+        num_buckets = max(1, -(-total // bucket_bytes))
+    if fmt == "binidx":
+        outputs = [f"{output_path}.{bucket:05d}" for bucket in range(num_buckets)]
+    else:
+        outputs = [shard_name(output_path, bucket) for bucket in range(num_buckets)]
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    spill_dir = tempfile.mkdtemp(prefix="shuffle_", dir=spill_dir)
+    try:
+        groups = [[(i, path) for i, path in enumerate(inputs) if i % num_workers == w] for w in range(num_workers)]
+        buffer_bytes = max(bucket_bytes // 4, 1 << 20)
+        with mp.Pool(num_workers) as pool:
+            pool.map(_scatter, [(fmt, group, num_buckets, seed, spill_dir, w, buffer_bytes) for w, group in enumerate(groups)])
+            tasks = [(fmt, bucket, num_workers, seed, spill_dir, outputs[bucket]) for bucket in range(num_buckets)]
+            counts = pool.map(_gather, tasks)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    print(f"Shuffled {sum(counts)} samples into {num_buckets} shards.")
+    return outputs
+
+
+def shuffle_jsonl(paths, output_path, seed=0, bucket_bytes=1 << 30, num_workers=None, spill_dir=None):
+    return external_shuffle("jsonl", paths, output_path, seed, bucket_bytes, num_workers=num_workers, spill_dir=spill_dir)
+
+
+def shuffle_binidx(prefixes, output_prefix, seed=0, bucket_bytes=1 << 30, num_workers=None, spill_dir=None, merge=True):
+    """Shuffle binidx pairs, with merge=True the shuffled shards are concatenated into `<output_prefix>.bin/.idx`."""
+    shards = external_shuffle("binidx", prefixes, output_prefix, seed, bucket_bytes, num_workers=num_workers, spill_dir=spill_dir)
+    if not merge:
+        return shards
+    merge_binidx(shards, output_prefix)
+    for shard in shards:
+        os.remove(shard + ".bin")
+        os.remove(shard + ".idx")
+    return [output_prefix]
+
+
+if __name__ == "__main__":
+    import glob
+
+    INPUT_FORMAT = "jsonl"  # "binidx" to shuffle .bin/.idx outputs
+    SEED = 42
+    BUCKET_BYTES = 1 << 30  # about the memory of one shuffle worker
+
+    if INPUT_FORMAT == "binidx":
+        prefixes = sorted(path[: -len(".bin")] for path in glob.glob("data/*.bin") if os.path.exists(path[: -len(".bin")] + ".idx"))
+        shuffle_binidx(prefixes, "data/shuffled/train", SEED, BUCKET_BYTES)
+    else:
+        paths = sorted(glob.glob("data/*.jsonl") + glob.glob("data/*.jsonl.gz") + glob.glob("data/*.jsonl.xz"))
+        shuffle_jsonl(paths, "data/shuffled/train.jsonl", SEED, BUCKET_BYTES)
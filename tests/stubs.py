@@ -0,0 +1,49 @@
+import random
+import hashlib
+from othello import Othello
+from alphabeta_engine import AlphaBetaEngine
+
+
+def stub_scores(moves):
+    """Deterministic engine scores in [-20, 20] for the legal moves after `moves`, ties included."""
+    game = Othello()
+    game.play_from_start(moves)
+    board = game.get_board_format()
+    scores = []
+    for move in game.get_legal_moves():
+        digest = hashlib.md5((board + move).encode()).digest()
+        scores.append((move, float(digest[0] % 41 - 20)))
+    return scores
+
+
+class StubAlphaBetaEngine(AlphaBetaEngine):
+    """`AlphaBetaEngine` without the Egaroucid process, `get_moves` answers with `stub_scores`."""
+
+    def __init__(self, **kwargs):
+        super().__init__("stub", endgame_empties=0, **kwargs)
+
+    def _start_engine(self):
+        pass
+
+    def cleanup(self):
+        pass
+
+    def get_moves(self, moves):
+        return stub_scores(moves.replace("ps", ""))
+
+
+def random_positions(count, seed=0):
+    """Move strings of random games cut at a random ply, including finished games."""
+    rng = random.Random(seed)
+    positions = []
+    game = Othello()
+    for _ in range(count):
+        game.reset()
+        plies = rng.randrange(0, 61)
+        for _ in range(plies):
+            legal = game.get_legal_moves()
+            if not legal:
+                break
+            game.play(rng.choice(legal))
+        positions.append(game.get_moves())
+    return positions
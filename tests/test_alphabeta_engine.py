@@ -0,0 +1,37 @@
+import random
+import pytest
+from trace_parser import parse_trace, trace_score
+from stubs import StubAlphaBetaEngine, random_positions
+
+
+SETTINGS = [(1, 1), (1, 4), (4, 1), (2, 2), (3, 3), (2, 5), (4, 3), (10, 2), (3, 4), (2, 6)]
+
+
+def traced_move_and_score(engine, moves, max_width, max_depth):
+    lines = []
+    move = engine.get_best_move(moves, max_width, max_depth, logger_func=lines.append)
+    record = parse_trace("\n".join(lines))
+    return move, trace_score(record) if move is not None else None
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_search_best_move_matches_trace(seed):
+    traced, fast = StubAlphaBetaEngine(), StubAlphaBetaEngine()
+    rng = random.Random(seed)
+    for moves in random_positions(100, seed):
+        max_width, max_depth = rng.choice(SETTINGS)
+        expected = traced_move_and_score(traced, moves, max_width, max_depth)
+        assert fast.search_best_move(moves, max_width, max_depth, return_score=True) == expected, (moves, max_width, max_depth)
+
+
+def test_search_best_move_returns_move_only_by_default():
+    engine = StubAlphaBetaEngine()
+    moves = "f5d6c3"
+    assert engine.search_best_move(moves, 3, 3) == engine.search_best_move(moves, 3, 3, return_score=True)[0]
+
+
+def test_search_best_move_end_game():
+    engine = StubAlphaBetaEngine()
+    game_over = next(moves for moves in random_positions(400, 7) if not engine.get_moves(moves))
+    assert engine.search_best_move(game_over, 3, 3) is None
+    assert engine.search_best_move(game_over, 3, 3, return_score=True) == (None, None)
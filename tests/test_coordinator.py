@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import threading
+import multiprocessing as mp
+import pytest
+from coordinator import LeaseCoordinator, CoordinatorServer, CoordinatorClient, run_worker
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(coordinator):
+        server = CoordinatorServer(("127.0.0.1", 0), coordinator)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address[1]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _worker(port, output_dir, name, die, results):
+    client = CoordinatorClient("127.0.0.1", port)
+
+    def generate_range(start, end, range_id, lease):
+        if die:  # killed in the middle of its first lease, the heartbeat stops with it
+            open(os.path.join(output_dir, f"dead_{range_id}"), "w").close()
+            os._exit(1)
+        time.sleep(0.05)
+        path = os.path.join(output_dir, f"r{range_id}_{lease}.txt")
+        with open(path, "w") as f:
+            f.write(f"{name} {start} {end}\n")
+        return [path]
+
+    results.put((name, run_worker(client, generate_range, name)))
+
+
+def test_workers_complete_every_range_once(tmp_path, server):
+    journal = str(tmp_path / "leases.jsonl")
+    coordinator = LeaseCoordinator(0, 40, 5, lease_timeout=1.0, journal_path=journal)
+    port = server(coordinator)
+    results = mp.Queue()
+    workers = [mp.Process(target=_worker, args=(port, str(tmp_path), f"w{i}", i == 0, results)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [1, 0, 0, 0]
+    completed = dict(results.get(timeout=5) for _ in range(3))
+    assert sum(completed.values()) == 8
+
+    with open(journal) as f:
+        entries = [json.loads(line) for line in f]
+    assert sorted(entry["range"] for entry in entries) == list(range(8))  # every range exactly once
+    for entry in entries:
+        start, end = entry["games"]
+        with open(entry["outputs"][0]) as f:
+            name, lo, hi = f.read().split()
+        assert (int(lo), int(hi)) == (start, end) and name != "w0"
+
+    # the range of the dead worker expired and was given to another worker
+    dead = [name for name in os.listdir(tmp_path) if name.startswith("dead_")]
+    assert len(dead) == 1
+    assert int(dead[0][len("dead_") :]) in [entry["range"] for entry in entries]
+
+    status = coordinator.status()
+    assert status["completed"] == 8 and not status["leased"]
+    assert len(status["outputs"]) == 8
+
+
+def test_late_complete_is_rejected_after_reassignment():
+    coordinator = LeaseCoordinator(0, 10, 5, lease_timeout=0.05)
+    first = coordinator.lease("a")
+    time.sleep(0.1)
+    second = coordinator.lease("b")
+    assert second["range"] == first["range"]  # expired, handed out again
+    assert coordinator.renew(first["lease"]) == {"ok": False}
+    assert coordinator.complete(first["lease"], ["a.jsonl"]) == {"ok": False}
+    assert coordinator.complete(second["lease"], ["b.jsonl"]) == {"ok": True}
+    assert coordinator.complete(second["lease"], ["b.jsonl"]) == {"ok": False}  # only once
+    assert coordinator.status()["outputs"] == ["b.jsonl"]
+
+
+def test_late_complete_is_accepted_if_not_reassigned():
+    coordinator = LeaseCoordinator(0, 10, 5, lease_timeout=0.05)
+    first = coordinator.lease("a")
+    time.sleep(0.1)
+    assert coordinator.complete(first["lease"], ["a.jsonl"]) == {"ok": True}
+
+
+def test_journal_is_restored_after_restart(tmp_path, server):
+    journal = str(tmp_path / "leases.jsonl")
+    coordinator = LeaseCoordinator(0, 20, 5, lease_timeout=10.0, journal_path=journal)
+    client = CoordinatorClient("127.0.0.1", server(coordinator))
+    done = []
+    for _ in range(3):
+        lease = client.request("lease", worker="a")
+        assert client.request("complete", lease=lease["lease"], outputs=[f"r{lease['range']}"])["ok"]
+        done.append(lease["range"])
+    open_lease = client.request("lease", worker="a")  # lost with the coordinator
+    client.close()
+
+    restarted = LeaseCoordinator(0, 20, 5, lease_timeout=10.0, journal_path=journal)
+    client = CoordinatorClient("127.0.0.1", server(restarted))
+    assert client.request("status")["completed"] == 3
+    lease = client.request("lease", worker="b")
+    assert lease["range"] == open_lease["range"] and lease["range"] not in done
+    assert client.request("complete", lease=lease["lease"], outputs=["late"])["ok"]
+    assert client.request("lease", worker="b") == {"finished": True}
+    assert client.request("status")["outputs"] == ["r0", "r1", "r2", "late"]
+    client.close()
+
+    with open(journal, "a") as f:
+        f.write('{"range": 1, "gam')  # torn last line of a crash
+    assert LeaseCoordinator(0, 20, 5, journal_path=journal).status()["completed"] == 4
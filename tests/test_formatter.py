@@ -0,0 +1,23 @@
+import random
+import pytest
+from formatter import TextTrace, format_stack
+from stubs import StubAlphaBetaEngine, random_positions
+
+
+class PlainTextTrace(TextTrace):
+    """Renders every stack from scratch."""
+
+    def stack(self, stack):
+        self.logger_func(format_stack(stack))
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_stack_formatter_matches_format_stack(seed):
+    engine = StubAlphaBetaEngine()
+    rng = random.Random(seed)
+    for moves in random_positions(50, seed):
+        max_width, max_depth = rng.choice([(2, 2), (3, 3), (2, 6), (4, 3), (3, 5)])
+        cached, plain = [], []
+        engine.get_best_move(moves, max_width, max_depth, logger_func=cached.append)
+        engine.get_best_move(moves, max_width, max_depth, trace=PlainTextTrace(plain.append))
+        assert cached == plain, (moves, max_width, max_depth)
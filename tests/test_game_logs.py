@@ -0,0 +1,61 @@
+import os
+import pytest
+from game_logs import GameLogReader
+
+
+def write_logs(folder, counts):
+    games = []
+    for i, count in enumerate(counts):
+        lines = ["f5d6c3d3c4" + "f4" * (j % 3) + "\n" for j in range(count)]  # read keeps the "\n"
+        with open(os.path.join(folder, f"{i:07d}.txt"), "w") as f:
+            f.write("".join(lines))
+        games += lines
+    return games
+
+
+def test_cached_index_skips_reading_the_files(tmp_path, monkeypatch):
+    games = write_logs(tmp_path, [5, 0, 7, 3])
+    index_path = str(tmp_path / ".index.json")
+    reader = GameLogReader(str(tmp_path), stride=2, index_path=index_path)
+    assert os.path.exists(index_path)
+    assert reader.read(0) == games
+
+    def fail(self, name):
+        raise AssertionError(f"{name} read again")
+
+    monkeypatch.setattr(GameLogReader, "_index_file", fail)
+    cached = GameLogReader(str(tmp_path), stride=2, index_path=index_path)
+    assert len(cached) == len(games)
+    assert cached.read(4, 13) == games[4:13]
+
+
+def test_index_rebuilt_when_a_file_changes(tmp_path):
+    write_logs(tmp_path, [5, 7])
+    index_path = str(tmp_path / ".index.json")
+    GameLogReader(str(tmp_path), index_path=index_path)
+    with open(tmp_path / "0000001.txt", "a") as f:
+        f.write("c4c3\n")
+    reader = GameLogReader(str(tmp_path), index_path=index_path)
+    assert len(reader) == 13
+    assert reader.read(12) == ["c4c3\n"]
+
+
+@pytest.mark.parametrize("index_name", ["missing/.index.json", "index_dir"])
+def test_unwritable_index_path_keeps_the_index_in_memory(tmp_path, index_name):
+    games = write_logs(tmp_path, [5, 7])
+    os.mkdir(tmp_path / "index_dir")  # os.replace cannot overwrite a directory
+    index_path = str(tmp_path / index_name)
+    reader = GameLogReader(str(tmp_path), stride=2, index_path=index_path)
+    assert reader.read(3, 9) == games[3:9]
+    assert not os.path.isfile(index_path)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    assert GameLogReader(str(tmp_path), stride=2, index_path=index_path).read() == games
+
+
+def test_corrupt_index_is_rebuilt(tmp_path):
+    games = write_logs(tmp_path, [5, 7])
+    index_path = tmp_path / ".index.json"
+    index_path.write_text('{"stride": 2, "fil')
+    reader = GameLogReader(str(tmp_path), stride=2, index_path=str(index_path))
+    assert reader.read() == games
+    assert len(GameLogReader(str(tmp_path), stride=2, index_path=str(index_path))) == len(games)
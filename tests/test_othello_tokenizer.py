@@ -0,0 +1,81 @@
+import random
+import pytest
+from formatter import format_stack_line
+from othello_tokenizer import OTHELLO_TOKENIZER, VOCAB_PATH, load_vocab
+from stubs import StubAlphaBetaEngine, random_positions
+
+rwkv_tokenizer = pytest.importorskip("rwkv.rwkv_tokenizer")
+
+VOCAB = load_vocab()
+
+
+@pytest.fixture(scope="module")
+def tokenizers():
+    return OTHELLO_TOKENIZER(VOCAB_PATH), rwkv_tokenizer.TRIE_TOKENIZER(VOCAB_PATH)
+
+
+def generated_traces(count, seed=0):
+    engine = StubAlphaBetaEngine()
+    rng = random.Random(seed)
+    traces = []
+    for moves in random_positions(count, seed):
+        max_width, max_depth = rng.choice([(1, 1), (2, 2), (3, 3), (2, 6), (4, 3), (10, 2)])
+        lines = []
+        engine.get_best_move(moves, max_width, max_depth, logger_func=lambda text, end="\n": lines.append(text + end))
+        traces.append("".join(lines))
+    return traces
+
+
+def edge_cases(seed=0):
+    rng = random.Random(seed)
+    tokens = list(VOCAB)
+    inf = float("inf")
+    node = {"move": None, "score": None, "remaining_moves": [], "is_max": True, "best_move": None, "alpha": -inf, "beta": inf}
+    texts = ["", "\n", "\n\n\n", format_stack_line(node) + "\n", "".join(tokens), "".join(reversed(tokens))]
+    texts += tokens  # every vocab token alone
+    texts += ["".join(rng.choices(tokens, k=rng.randrange(1, 40))) for _ in range(500)]  # prefixes of longer tokens
+    return texts
+
+
+def assert_same(tokenizers, texts):
+    tokenizer, reference = tokenizers
+    for text in texts:
+        tokens = tokenizer.encode(text)
+        assert tokens == reference.encode(text), repr(text)
+        assert tokenizer.decode(tokens) == reference.decode(tokens) == text, repr(text)
+
+
+def test_generated_traces(tokenizers):
+    traces = generated_traces(200)
+    assert any("+in" in text or "-in" in text for text in traces)
+    assert_same(tokenizers, traces)
+
+
+def test_edge_cases(tokenizers):
+    assert_same(tokenizers, edge_cases())
+
+
+def test_every_vocab_token(tokenizers):
+    tokenizer, reference = tokenizers
+    for token, idx in VOCAB.items():
+        assert tokenizer.encode(token) == reference.encode(token) == [idx], repr(token)
+
+
+def test_encode_batch(tokenizers):
+    tokenizer, reference = tokenizers
+    docs = generated_traces(50, seed=1) + edge_cases(seed=1)[:100]
+    tokens, offsets = tokenizer.encode_batch(docs)
+    assert len(offsets) == len(docs) + 1 and offsets[0] == 0
+    for i, doc in enumerate(docs):
+        assert tokens[offsets[i] : offsets[i + 1]].tolist() == reference.encode(doc), repr(doc)
+
+
+def test_encode_passes_token_ids_through(tokenizers):
+    tokenizer, _ = tokenizers
+    assert tokenizer.encode([1, 2, 3]) == [1, 2, 3]
+
+
+def test_outside_of_vocab(tokenizers):
+    tokenizer, _ = tokenizers
+    with pytest.raises(ValueError):
+        tokenizer.encode("not othello")
@@ -0,0 +1,39 @@
+import random
+import types
+import pytest
+import alphabeta_engine
+from othello_tokenizer import VOCAB_PATH
+from token_formatter import TokenTrace
+from stubs import StubAlphaBetaEngine, random_positions
+
+rwkv_tokenizer = pytest.importorskip("rwkv.rwkv_tokenizer")
+
+SETTINGS = [(1, 1), (3, 1), (1, 3), (2, 2), (3, 3), (2, 6), (4, 3), (10, 2), (3, 5)]
+
+
+def assert_token_traces_match(seed, count):
+    tokenizer = rwkv_tokenizer.TRIE_TOKENIZER(VOCAB_PATH)
+    engine = StubAlphaBetaEngine()
+    rng = random.Random(seed)
+    texts = []
+    for moves in random_positions(count, seed):
+        max_width, max_depth = rng.choice(SETTINGS)
+        lines = []
+        engine.get_best_move(moves, max_width, max_depth, logger_func=lambda text, end="\n": lines.append(text + end))
+        trace = TokenTrace()
+        engine.get_best_move(moves, max_width, max_depth, trace=trace)
+        assert trace.tokens == tokenizer.encode("".join(lines)), (moves, max_width, max_depth)
+        texts.append("".join(lines))
+    return texts
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_token_trace_matches_text_trace(seed):
+    assert_token_traces_match(seed, 80)
+
+
+def test_token_trace_matches_text_trace_with_track_moves(monkeypatch):
+    # TRACK_MOVES_PROB is 0 in get_best_move, force the "Previous moves:" lines
+    monkeypatch.setattr(alphabeta_engine, "random", types.SimpleNamespace(random=lambda: -1.0))
+    texts = assert_token_traces_match(10, 80)
+    assert sum("Previous moves:" in text for text in texts) > 40
@@ -0,0 +1,108 @@
+import random
+import pytest
+from othello import Othello
+from othello_tokenizer import OTHELLO_TOKENIZER
+from trace_parser import TraceParser, parse_trace
+from stubs import StubAlphaBetaEngine, random_positions
+
+
+def generated_traces(count, seed=0):
+    engine = StubAlphaBetaEngine()
+    rng = random.Random(seed)
+    traces = []
+    for moves in random_positions(count, seed):
+        lines = []
+        engine.get_best_move(moves, *rng.choice([(1, 1), (2, 2), (3, 3), (2, 5)]), logger_func=lambda text, end="\n": lines.append(text + end))
+        traces.append("".join(lines))
+    return traces
+
+
+def feed_in_pieces(text, rng):
+    parser = TraceParser()
+    idx = 0
+    while idx < len(text):
+        step = rng.randrange(1, 40)
+        parser.feed(text[idx : idx + step])
+        idx += step
+    return parser.close()
+
+
+def test_generated_traces_parse_cleanly():
+    rng = random.Random(0)
+    for text in generated_traces(50):
+        record = feed_in_pieces(text, rng)
+        assert record["complete"] and not record["unparsed"]
+        assert record == parse_trace(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Possible moves and score: f5 +7\n",
+        "<stack>\nRemaining_Depth:x\n",
+        "<stack>\nMax_Node Alpha: -in ",
+        "MAX_WIDTH-x\nMAX_DEPTH-\n",
+    ],
+)
+def test_malformed_lines_are_unparsed(text):
+    record = parse_trace(text)
+    assert len(record["unparsed"]) == text.count("\n") + (not text.endswith("\n")) - text.startswith("<stack>\n")
+    assert record["move"] is None
+
+
+def test_truncated_and_garbled_traces_never_raise():
+    rng = random.Random(1)
+    tokenizer = OTHELLO_TOKENIZER()
+    vocab = list(tokenizer.token2idx)
+    for text in generated_traces(30, seed=1):
+        for cut in sorted(rng.sample(range(len(text)), 20)):  # cut anywhere, also inside a line
+            record = feed_in_pieces(text[:cut], rng)
+            assert not record["complete"] or text[:cut].rstrip("\n") == text.rstrip("\n")
+        pieces = tokenizer.split(text)
+        for _ in range(20):  # one wrong token, as a sampling model would produce
+            garbled = list(pieces)
+            garbled[rng.randrange(len(garbled))] = rng.choice(vocab)
+            feed_in_pieces("".join(garbled), rng)
+
+
+class FakePipeline:
+    """Stands in for rwkv.utils.PIPELINE: streams `text` to the callback in small chunks, at most `token_count` of them."""
+
+    def __init__(self, text):
+        self.pieces = [text[i : i + 3] for i in range(0, len(text), 3)]
+
+    def decode(self, tokens):
+        return OTHELLO_TOKENIZER().decode(tokens)
+
+    def generate(self, input_ids, token_count, args, callback):
+        for piece in self.pieces[:token_count]:
+            callback(piece)
+
+
+def rwkv_engine_with_output(text, stop_at_move=False):
+    rwkv_engine = pytest.importorskip("rwkv_engine")  # needs torch through rwkv.utils
+    engine = rwkv_engine.RWKVEngine.__new__(rwkv_engine.RWKVEngine)
+    engine.max_width, engine.max_depth = 2, 2
+    engine.pipeline = FakePipeline(text)
+    engine.gen_args = None
+    engine.game = Othello()
+    engine.print_output = False
+    engine.stop_at_move = stop_at_move
+    engine.parser = None
+    engine.leagal_moves = [f"{x}{y}" for x in "abcdefgh" for y in range(1, 9)]
+    engine.token_counts = engine.gen_counts = 0
+    return engine
+
+
+def test_rwkv_engine_returns_er_on_bad_output():
+    text = generated_traces(1, seed=3)[0]
+    reasoning = text[text.index("<reasoning>") :]
+    move = parse_trace(text)["move"]
+    assert rwkv_engine_with_output(reasoning).get_best_move("") == move
+    assert rwkv_engine_with_output(reasoning, stop_at_move=True).get_best_move("") == move
+    # cut off by max_token_count in the middle of a stack line
+    cut = reasoning.index("Alpha: ") + len("Alpha: -in ") if "Alpha: " in reasoning else 20
+    assert rwkv_engine_with_output(reasoning[:cut]).get_best_move("") == "er"
+    assert rwkv_engine_with_output(reasoning).get_best_move("", max_token_count=5) == "er"
+    garbled = reasoning.replace("Remaining_Depth:2\n", "Remaining_Depth:\n").replace("<output>\n", "<output>\n+")
+    assert rwkv_engine_with_output(garbled).get_best_move("") == "er"
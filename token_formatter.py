@@ -0,0 +1,177 @@
+from itertools import product
+from formatter import CELL_SYMBOLS, SQUARE_NAMES, SQUARE_INDEX, format_score
+from othello_tokenizer import load_vocab
+
+
+VOCAB = load_vocab()
+NEWLINE = VOCAB["\n"]
+
+# token ids of the pieces formatter.py produces, precomputed like the text tables
+ROW_TOKENS = {cells: [VOCAB[CELL_SYMBOLS[cell] + " "] for cell in cells] + [NEWLINE] for cells in product(range(3), repeat=8)}
+COLOR_TOKENS = {color: [VOCAB["NEXT "], VOCAB[symbol + " "], NEWLINE] for color, symbol in [(1, "●"), (2, "○")]}
+SQUARE_TOKENS = {name: VOCAB[f" {name} "] for name in SQUARE_NAMES + ["ps", "--"]}
+SCORE_TOKENS = {"+in": [VOCAB["+in"]], "-in": [VOCAB["-in"]], "---": [VOCAB["---"]]}
+
+
+def score_tokens(score):
+    text = format_score(score)
+    tokens = SCORE_TOKENS.get(text)
+    if tokens is None:
+        tokens = SCORE_TOKENS[text] = [VOCAB[ch] for ch in text]
+    return tokens
+
+
+def board_tokens(board):
+    """Token ids of `format_board(board)` followed by "\\n"."""
+    tokens = []
+    for row in board:
+        tokens += ROW_TOKENS[tuple(row)]
+    return tokens
+
+
+def args_tokens(max_width, max_depth):
+    return [VOCAB[f"MAX_WIDTH-{max_width}\n"], VOCAB[f"MAX_DEPTH-{max_depth}\n"]]
+
+
+def moves_tokens(moves_list):
+    """Token ids of `format_possible_moves_no_sort(moves_list)`."""
+    tokens = []
+    for pos, score in moves_list:
+        tokens.append(SQUARE_TOKENS[pos])
+        tokens += score_tokens(score)
+    return tokens
+
+
+def sorted_moves_tokens(moves_list):
+    """Token ids of `format_possible_moves(moves_list)`."""
+    return moves_tokens(sorted(moves_list, key=lambda x: SQUARE_INDEX[x[0]]))
+
+
+def input_tokens(board, color, max_width, max_depth, track_moves=False):
+    """Token ids of the <input> block, including the empty line after it."""
+    tokens = [VOCAB["<input>\n"]] + board_tokens(board) + COLOR_TOKENS[color] + args_tokens(max_width, max_depth)
+    if track_moves:
+        tokens.append(VOCAB["TRACK_ENABLE\n"])
+    tokens.append(VOCAB["</input>\n\n"])
+    return tokens
+
+
+def stack_line_tokens(node):
+    """Token ids of `formatter.format_stack_line(node)`."""
+    tokens = [VOCAB["Max_Node "] if node["is_max"] else VOCAB["Min_Node "], VOCAB["Alpha: "]]
+    tokens += score_tokens(node["alpha"])
+    tokens.append(VOCAB[" Beta: "])
+    tokens += score_tokens(node["beta"])
+    tokens += [VOCAB[" Best:"], SQUARE_TOKENS[node["best_move"] or "--"], VOCAB["Current:"], SQUARE_TOKENS[node["move"] or "--"]]
+    tokens += score_tokens(node["score"]) if node["score"] is not None else SCORE_TOKENS["---"]
+    tokens.append(VOCAB[" Unexplored:"])
+    tokens += moves_tokens(node["remaining_moves"])
+    return tokens
+
+
+def stack_tokens(stack):
+    """Token ids of `formatter.format_stack(stack)`."""
+    tokens = [VOCAB["<stack>\n"], VOCAB[f"Remaining_Depth:{stack[-1]['remaining_depth']}\n"]]
+    for i, node in enumerate(reversed(stack)):
+        if i:
+            tokens.append(NEWLINE)
+        tokens += stack_line_tokens(node)
+    tokens.append(VOCAB["\n</stack>"])
+    return tokens
+
+
+class TokenTrace:
+    """
+    Writes a search trace as token ids of othello_vocab.txt, without building the text.
+    Same interface as `formatter.TextTrace`, `tokens` equals `TRIE_TOKENIZER.encode` of the text trace.
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.pending_newline = False  # the "\n" after </stack> merges into the "=> Search next node" token
+
+    def _emit(self, tokens):
+        if self.pending_newline:
+            self.tokens.append(NEWLINE)
+            self.pending_newline = False
+        self.tokens += tokens
+
+    def input(self, board, color, max_width, max_depth, track_moves=False):
+        self._emit(input_tokens(board, color, max_width, max_depth, track_moves))
+
+    def reasoning(self):
+        self._emit([VOCAB["<reasoning>\n"]])
+
+    def possible_moves(self, moves_list):
+        self._emit([VOCAB["Possible moves and score:"]] + sorted_moves_tokens(moves_list) + [NEWLINE])
+
+    def opponent_possible_moves(self, moves_list):
+        self._emit([VOCAB["Possible moves and score:"], NEWLINE, VOCAB["Opponent possible moves and score:"]])
+        self._emit(sorted_moves_tokens(moves_list) + [NEWLINE])
+
+    def line(self, text):
+        self._emit([VOCAB[text + "\n"]])
+
+    def search_next_node(self):
+        self.pending_newline = False
+        self._emit([VOCAB["\n\n=> Search next node\n"]])
+
+    def previous_moves(self, moves):
+        moves = [moves[i : i + 2] for i in range(0, len(moves), 2)]
+        self._emit([VOCAB["Previous moves:"]] + [SQUARE_TOKENS[move] for move in moves] + [NEWLINE])
+
+    def board(self, board, color):
+        self._emit([VOCAB["<board>\n"]] + board_tokens(board) + [VOCAB["</board>\n"]] + COLOR_TOKENS[color])
+
+    def stack(self, stack):
+        self._emit(stack_tokens(stack))
+        self.pending_newline = True
+
+    def play(self, move, board):
+        tokens = [VOCAB["> Playing"], SQUARE_TOKENS[move], NEWLINE, VOCAB["</reasoning>\n\n"]]
+        tokens += [VOCAB["<output>\n"], SQUARE_TOKENS[move], NEWLINE] + board_tokens(board) + [VOCAB["</output>\n\n"]]
+        self._emit(tokens)
+
+    def clear(self):
+        self.tokens = []
+        self.pending_newline = False
+
+
+def verify_token_traces(engine, tokenizer, inputs):
+    """
+    Generate every (moves, width, depth) input as text and as tokens with the same engine,
+    and check the token trace against `tokenizer.encode` of the text. Returns the number of mismatches.
+    """
+    from logger import DataLogger
+
+    logger = DataLogger(print_to_console=False)
+    mismatches = 0
+    for input_moves, max_width, max_depth in inputs:
+        logger.clear()
+        engine.get_best_move(input_moves, max_width, max_depth, logger_func=logger.log_func)
+        trace = TokenTrace()
+        engine.get_best_move(input_moves, max_width, max_depth, trace=trace)
+        if tokenizer.encode(logger.log) != trace.tokens:
+            mismatches += 1
+            print(f"Mismatch: {input_moves} {max_width} {max_depth}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    import random
+    from rwkv.rwkv_tokenizer import TRIE_TOKENIZER
+    from alphabeta_engine import AlphaBetaEngine
+    from generate_data import read_all_txt_files, sample_game_states, power_pairs
+
+    ENGINE_PATH = "Egaroucid_for_Console_7_5_1_Windows_SIMD\Egaroucid_for_Console_7_5_1_SIMD.exe"
+    GAME_LOGS_PATH = "./0000_egaroucid_6_3_0_lv11"
+    NUM_SAMPLES = 1000
+
+    random.seed(42)
+    games = read_all_txt_files(GAME_LOGS_PATH)[:NUM_SAMPLES]
+    inputs = [(moves, *random.choice(power_pairs(100))) for moves in sample_game_states(games, 1, 0.9)]
+
+    engine = AlphaBetaEngine(ENGINE_PATH, level=1, threads=1)
+    mismatches = verify_token_traces(engine, TRIE_TOKENIZER("othello_vocab.txt"), inputs)
+    print(f"{len(inputs) - mismatches}/{len(inputs)} token traces match the tokenizer.")
+    engine.cleanup()
@@ -0,0 +1,125 @@
+import re
+import json
+from othello_tokenizer import OTHELLO_TOKENIZER, VOCAB_PATH
+from block_jsonl import iter_jsonl
+
+
+# token cost of the fixed parts of a trace, see formatter.py and othello_vocab.txt
+BOARD_TOKENS = 72  # 8 rows of 8 cells + "\n"
+INPUT_TOKENS = 1 + BOARD_TOKENS + 3 + 2 + 1  # <input>, board, NEXT + color + "\n", MAX_WIDTH/MAX_DEPTH, </input>
+OUTPUT_TOKENS = 3 + 1 + 1 + 2 + BOARD_TOKENS + 1  # > Playing + move + "\n", </reasoning>, <output>, move + "\n", board, </output>
+MOVE_TOKENS = 4  # " a1 " + sign + 2 digits
+MAX_LEGAL_MOVES = 33
+STACK_TOKENS = 3  # <stack>, Remaining_Depth, </stack>
+STACK_LINE_TOKENS = 19  # node type, alpha, beta, best, current move and score, "\n" (without unexplored moves)
+SEARCH_STEP_TOKENS = 1 + 1 + 1 + BOARD_TOKENS + 1 + 3 + 2 + 1 + 2  # header, depth flag, board, color, opponent moves, status, action
+
+
+def count_empties(input_moves):
+    return 60 - len(input_moves.replace("ps", "")) // 2
+
+
+def search_steps(max_width, max_depth):
+    """Upper bound of '=> Search next node' steps: one per move of every node above depth 1, one per depth-1 node."""
+    if max_width == 1 or max_depth == 1:
+        return 0
+    return sum(max_width**k for k in range(1, max_depth)) + max_width ** (max_depth - 1)
+
+
+def worst_case_tokens(empties, max_width, max_depth):
+    """Upper bound of the token count of an `AlphaBetaEngine` trace."""
+    moves_tokens = MOVE_TOKENS * min(empties, MAX_LEGAL_MOVES)
+    tokens = INPUT_TOKENS + 4 + moves_tokens + OUTPUT_TOKENS  # <reasoning>, root moves, final status line
+    steps = search_steps(max_width, max_depth)
+    if steps:
+        stack_tokens = STACK_TOKENS + max_depth * (STACK_LINE_TOKENS + MOVE_TOKENS * (max_width - 1))
+        tokens += stack_tokens + 1 + steps * (SEARCH_STEP_TOKENS + moves_tokens + stack_tokens + 2)
+    return tokens
+
+
+def parse_settings(text):
+    """Read (empties, max_width, max_depth) back from the <input> block of a trace."""
+    input_block = text[: text.index("</input>")]
+    empties = input_block.count("·")
+    max_width = int(re.search(r"MAX_WIDTH-(\d+)", input_block).group(1))
+    max_depth = int(re.search(r"MAX_DEPTH-(\d+)", input_block).group(1))
+    return empties, max_width, max_depth
+
+
+class TraceLengthEstimator:
+    """
+    Estimate the token count of a trace before generating it.
+    Without data the worst case bound is used. `fit` learns, for every (width, depth) setting,
+    the largest ratio between the real token count and the bound seen in past samples.
+    """
+
+    def __init__(self, ratios=None):
+        self.ratios = ratios or {}  # (max_width, max_depth) -> (sample count, mean ratio, max ratio)
+
+    def estimate(self, input_moves, max_width, max_depth):
+        bound = worst_case_tokens(count_empties(input_moves), max_width, max_depth)
+        if (max_width, max_depth) in self.ratios:
+            return int(bound * self.ratios[(max_width, max_depth)][2]) + 1
+        return bound
+
+    def fit(self, jsonl_paths, vocab_path=VOCAB_PATH, max_samples=None):
+        tokenizer = OTHELLO_TOKENIZER(vocab_path)
+        stats = {}
+        seen = 0
+        for path in jsonl_paths:
+            for line in iter_jsonl(path):
+                text = json.loads(line)["text"]
+                empties, max_width, max_depth = parse_settings(text)
+                ratio = len(tokenizer.split(text)) / worst_case_tokens(empties, max_width, max_depth)
+                stats.setdefault((max_width, max_depth), []).append(ratio)
+                seen += 1
+                if max_samples and seen >= max_samples:
+                    break
+            if max_samples and seen >= max_samples:
+                break
+        for setting, ratios in stats.items():
+            self.ratios[setting] = (len(ratios), sum(ratios) / len(ratios), max(ratios))
+        return self
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({f"{w},{d}": list(v) for (w, d), v in self.ratios.items()}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls({tuple(int(x) for x in k.split(",")): tuple(v) for k, v in data.items()})
+
+
+def filter_by_token_budget(inputs, search_tree_settings, estimator, token_budget, policy="rebucket", rng=None):
+    """
+    Drop or re-assign generation inputs [(moves, width, depth, ...), ...] whose estimated trace exceeds `token_budget`.
+    policy="skip" drops them, policy="rebucket" draws another setting that fits (and drops the input if none does).
+    Extra fields after the depth are kept as they are.
+    """
+    assert policy in ["skip", "rebucket"], "Invalid policy"
+    kept, skipped, rebucketed = [], 0, 0
+    for moves, max_width, max_depth, *extra in inputs:
+        if estimator.estimate(moves, max_width, max_depth) <= token_budget:
+            kept.append((moves, max_width, max_depth, *extra))
+            continue
+        if policy == "rebucket":
+            fitting = [s for s in search_tree_settings if estimator.estimate(moves, *s) <= token_budget]
+            if fitting:
+                kept.append((moves, *rng.choice(fitting), *extra))
+                rebucketed += 1
+                continue
+        skipped += 1
+    print(f"Token budget {token_budget}: kept {len(kept) - rebucketed}, rebucketed {rebucketed}, skipped {skipped}.")
+    return kept
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python trace_length.py data/a.jsonl data/b.jsonl ... -> fit and save the estimator
+    estimator = TraceLengthEstimator().fit(sys.argv[1:])
+    for (max_width, max_depth), (count, mean_ratio, max_ratio) in sorted(estimator.ratios.items()):
+        print(f"width {max_width} depth {max_depth}: {count} samples, mean ratio {mean_ratio:.3f}, max ratio {max_ratio:.3f}")
+    estimator.save("data/trace_length_model.json")
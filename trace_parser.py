@@ -0,0 +1,233 @@
+import json
+from formatter import ROW_STRINGS, SCORE_STRINGS
+from othello_tokenizer import load_vocab
+from block_jsonl import iter_jsonl
+
+
+ROW_CELLS = {row: list(cells) for cells, row in ROW_STRINGS.items()}  # "· ● ○ ... " -> [0, 1, 2, ...]
+SCORE_VALUES = {text: score for score, text in SCORE_STRINGS.items()}  # "+05" -> 5, "-in" -> -inf
+PLAYERS = {"NEXT ● ": 1, "NEXT ○ ": 2}
+TOKEN_STRINGS = {idx: token for token, idx in load_vocab().items()}
+
+
+def parse_moves(text):
+    """ " f2 -14 g2 -20" -> [("f2", -14), ("g2", -20)]"""
+    parts = text.split()
+    return [(parts[i], SCORE_VALUES[parts[i + 1]]) for i in range(0, len(parts) - 1, 2)]
+
+
+def parse_stack_line(line):
+    """Inverse of `formatter.format_stack_line`, returns a node dict like the ones of `AlphaBetaEngine.get_best_move`."""
+    parts = line.split()
+    # Max_Node Alpha: -in Beta: +in Best: -- Current: e7 +20 Unexplored: d8 +13
+    return {
+        "move": None if parts[8] == "--" else parts[8],
+        "score": SCORE_VALUES.get(parts[9]),  # "---" -> None
+        "remaining_moves": parse_moves(" ".join(parts[11:])),
+        "is_max": parts[0] == "Max_Node",
+        "best_move": None if parts[6] == "--" else parts[6],
+        "alpha": SCORE_VALUES[parts[2]],
+        "beta": SCORE_VALUES[parts[4]],
+    }
+
+
+class TraceParser:
+    """
+    Single-pass parser of a search trace, written by `AlphaBetaEngine` or generated by the model.
+    Text (or token ids) can be fed in pieces of any size, complete lines are parsed as they arrive,
+    and `on_move(move)` is called as soon as the move after <output> is known.
+
+    `record` holds the result:
+        board, player, max_width, max_depth, track_moves: the <input> block (None if the input was not fed)
+        possible_moves: [(move, score)] of the root position
+        search: one dict per "=> Search next node" with status lines, board, player, possible_moves, opponent,
+            and stack_index, the index in `stacks` of the stack printed before it
+        stacks: one dict per <stack> with remaining_depth and nodes (root first, like the engine stack)
+        playing, move, output_board: the final move and board
+        complete: True once </output> is seen
+        unparsed: lines that did not match the trace format or could not be parsed, they never raise
+    """
+
+    def __init__(self, on_move=None):
+        self.on_move = on_move
+        self.buffer = ""
+        self.rows = None  # board being read
+        self.expect_move = False
+        self.stack = None
+        self.node = None  # current search node, None before the first "=> Search next node"
+        self.record = {
+            "board": None,
+            "player": None,
+            "max_width": None,
+            "max_depth": None,
+            "track_moves": False,
+            "possible_moves": [],
+            "status": [],
+            "search": [],
+            "stacks": [],
+            "playing": None,
+            "move": None,
+            "output_board": None,
+            "complete": False,
+            "unparsed": [],
+        }
+
+    @property
+    def move(self):
+        return self.record["move"]
+
+    @property
+    def score(self):
+        return trace_score(self.record)
+
+    def feed(self, text):
+        if "\n" not in text:
+            self.buffer += text
+            return
+        lines = (self.buffer + text).split("\n")
+        self.buffer = lines.pop()
+        for line in lines:
+            self._parse_line(line)
+
+    def feed_tokens(self, tokens):
+        self.feed("".join([TOKEN_STRINGS[int(i)] for i in tokens]))
+
+    def close(self):
+        """Parse the last line if the text does not end with a newline. Returns the record."""
+        if self.buffer:
+            self._parse_line(self.buffer)
+            self.buffer = ""
+        return self.record
+
+    def _start_board(self):
+        self.rows = []
+        return self.rows
+
+    def _parse_line(self, line):
+        try:
+            self._parse_known_line(line)
+        except (KeyError, ValueError, IndexError):  # garbled or cut off by the model, e.g. "f5 +7" or "Max_Node Alpha: -in "
+            self.record["unparsed"].append(line)
+
+    def _parse_known_line(self, line):
+        record = self.record
+
+        if self.rows is not None:
+            cells = ROW_CELLS.get(line)
+            if cells is not None:
+                self.rows.append(cells)
+                if len(self.rows) == 8:
+                    self.rows = None
+                return
+            self.rows = None
+
+        if self.expect_move:
+            self.expect_move = False
+            record["move"] = line.strip()
+            record["output_board"] = self._start_board()
+            if self.on_move:
+                self.on_move(record["move"])
+            return
+
+        if not line:
+            return
+        target = self.node if self.node is not None else record
+
+        if line.startswith("Possible moves and score:"):
+            moves = parse_moves(line[25:])
+            if moves or not target["possible_moves"]:
+                target["possible_moves"] = moves
+        elif line[0] == "[":
+            target["status"].append(line)
+        elif line.startswith(("Max_Node", "Min_Node")):
+            if self.stack is not None:
+                self.stack["nodes"].insert(0, parse_stack_line(line))
+        elif line in PLAYERS:
+            target["player"] = PLAYERS[line]
+        elif line == "<stack>":
+            self.stack = {"remaining_depth": None, "nodes": []}
+            record["stacks"].append(self.stack)
+        elif line.startswith("Remaining_Depth:"):
+            if self.stack is not None:
+                self.stack["remaining_depth"] = int(line[16:])
+        elif line == "</stack>":
+            self.stack = None
+        elif line == "=> Search next node":
+            self.node = {
+                "status": [],
+                "board": None,
+                "player": None,
+                "possible_moves": [],
+                "opponent": False,
+                "previous_moves": None,
+                "stack_index": len(record["stacks"]) - 1,  # the stack printed before this step
+            }
+            record["search"].append(self.node)
+        elif line == "<board>":
+            target["board"] = self._start_board()
+        elif line.startswith("Opponent possible moves and score:"):
+            target["possible_moves"] = parse_moves(line[34:])
+            target["opponent"] = True
+        elif line.startswith("Previous moves:"):
+            target["previous_moves"] = "".join(line[15:].split())
+        elif line.startswith("> Playing"):
+            record["playing"] = line[9:].strip()
+        elif line == "<output>":
+            self.expect_move = True
+        elif line == "</output>":
+            record["complete"] = True
+        elif line == "<input>":
+            record["board"] = self._start_board()
+        elif line.startswith("MAX_WIDTH-"):
+            record["max_width"] = int(line[10:])
+        elif line.startswith("MAX_DEPTH-"):
+            record["max_depth"] = int(line[10:])
+        elif line == "TRACK_ENABLE":
+            record["track_moves"] = True
+        elif line not in ("</input>", "<reasoning>", "</reasoning>", "</board>"):
+            record["unparsed"].append(line)
+
+
+def trace_score(record):
+    """
+    Score of the played move from the root player's view:
+    the root alpha of the last stack, or the move's own score if the search had no stack (width or depth 1).
+    """
+    if record["stacks"] and record["stacks"][-1]["nodes"]:
+        return record["stacks"][-1]["nodes"][0]["alpha"]
+    return dict(record["possible_moves"]).get(record["move"])
+
+
+def parse_trace(text):
+    parser = TraceParser()
+    parser.feed(text)
+    return parser.close()
+
+
+def parse_jsonl(jsonl_paths):
+    """Yield the parsed record of every sample in the JSONL files."""
+    for path in jsonl_paths:
+        for line in iter_jsonl(path):
+            yield parse_trace(json.loads(line)["text"])
+
+
+if __name__ == "__main__":
+    import glob
+
+    JSONL_PATHS = glob.glob("data/*.jsonl")
+
+    count = incomplete = search_nodes = stacks = 0
+    settings = {}
+    for record in parse_jsonl(JSONL_PATHS):
+        count += 1
+        incomplete += not record["complete"]
+        search_nodes += len(record["search"])
+        stacks += len(record["stacks"])
+        key = (record["max_width"], record["max_depth"])
+        settings[key] = settings.get(key, 0) + 1
+
+    print(f"{count} traces, {incomplete} incomplete")
+    if count:
+        print(f"avg search nodes: {search_nodes / count:.2f}, avg stacks: {stacks / count:.2f}")
+    for (max_width, max_depth), n in sorted(settings.items()):
+        print(f"width {max_width} depth {max_depth}: {n}")
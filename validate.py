@@ -0,0 +1,230 @@
+import os
+import json
+import multiprocessing as mp
+from othello import Othello
+from trace_parser import parse_trace
+from block_jsonl import iter_jsonl
+
+
+def _path_moves(nodes):
+    """Moves from the root to the node searched next: the current moves of the stack, root first, up to the first finished node."""
+    moves = []
+    for node in nodes:
+        if node["move"] is None:
+            break
+        moves.append(node["move"])
+    return tuple(moves)
+
+
+class _Replay:
+    """Follows the search path with push/pop on one board, passes ("ps") are played automatically by `Othello`."""
+
+    def __init__(self, board, player):
+        self.game = Othello()
+        self.game.board = [list(row) for row in board]
+        self.game.current_player = player
+        self.path = []  # (move, pushed)
+
+    def goto(self, moves):
+        common = 0
+        while common < min(len(self.path), len(moves)) and self.path[common][0] == moves[common]:
+            common += 1
+        while len(self.path) > common:
+            if self.path.pop()[1]:
+                self.game.pop()
+        for move in moves[common:]:
+            if move == "ps":
+                self.path.append((move, False))
+            elif self.game.push(move):
+                self.path.append((move, True))
+            else:
+                return False
+        return True
+
+
+def validate_record(record):
+    """Consistency errors of a parsed trace (see trace_parser.py), an empty list for a good sample."""
+    errors = []
+    if not record["complete"]:
+        errors.append("incomplete trace")
+    if record["unparsed"]:
+        errors.append(f"unparsed line: {record['unparsed'][0]!r}")
+    board, player = record["board"], record["player"]
+    if board is None or len(board) != 8 or player is None:
+        return errors + ["missing <input> board"]
+
+    replay = _Replay(board, player)
+    legal = replay.game.get_legal_moves()
+    root_moves = dict(record["possible_moves"])
+    if set(root_moves) != set(legal):
+        errors.append(f"root possible moves are not the legal moves: {sorted(root_moves)} vs {sorted(legal)}")
+
+    # possible moves printed for every position of the search, by path from the root
+    printed = {(): root_moves}
+    for step, node in enumerate(record["search"]):
+        if node["stack_index"] < 0:
+            errors.append(f"search step before any stack: step {step}")
+            continue
+        moves = _path_moves(record["stacks"][node["stack_index"]]["nodes"])
+        if not replay.goto(moves):
+            errors.append(f"illegal move on the stack path: step {step}, {' '.join(moves)}")
+            continue
+        if node["board"] is None:  # depth limit reached, nothing printed
+            continue
+        expected_player = player if len(moves) % 2 == 0 else 3 - player
+        if node["board"] != replay.game.board:
+            errors.append(f"<board> does not match the stack path: step {step}, {' '.join(moves)}")
+        if node["player"] != expected_player:
+            errors.append(f"wrong player to move: step {step}")
+        if node["opponent"] != (replay.game.current_player != expected_player):
+            errors.append(f"opponent moves flag does not match the position: step {step}")
+        node_moves = dict(node["possible_moves"])
+        if set(node_moves) != set(replay.game.get_legal_moves()):
+            errors.append(f"possible moves are not the legal moves: step {step}")
+        printed[moves] = node_moves
+
+    # every move and score on a stack comes from the possible moves of its position
+    for idx, stack in enumerate(record["stacks"]):
+        nodes = stack["nodes"]
+        for depth, node in enumerate(nodes):
+            parent = tuple(n["move"] for n in nodes[:depth])
+            if node["move"] == "ps" or None in parent:  # below a finished node: left over, popped next
+                continue
+            if parent not in printed:
+                errors.append(f"stack node without a printed position: stack {idx}, depth {depth}")
+                continue
+            listed = printed[parent]
+            entries = node["remaining_moves"] + ([(node["move"], node["score"])] if node["move"] is not None else [])
+            for move, score in entries:
+                if listed.get(move, object()) != score:
+                    errors.append(f"stack move or score not in the possible moves: stack {idx}, {move} {score}")
+
+    move = record["move"]
+    if move is None:
+        return errors + ["no output move"]
+    if record["playing"] != move:
+        errors.append(f"> Playing does not match <output>: {record['playing']} vs {move}")
+    if record["stacks"] and record["stacks"][-1]["nodes"]:
+        expected_moves = [record["stacks"][-1]["nodes"][0]["best_move"]]
+    elif root_moves:  # no search (width or depth 1): the best scored move, any of them on a tie
+        expected_moves = [m for m, score in root_moves.items() if score == max(root_moves.values())]
+    else:
+        expected_moves = ["ps"]
+    if move not in expected_moves:
+        errors.append(f"played move is not the search result: {move} vs {' '.join(map(str, expected_moves))}")
+    replay.goto(())
+    if move != "ps" and not replay.game.push(move):
+        errors.append(f"played move is illegal: {move}")
+    elif record["output_board"] != replay.game.board:
+        errors.append("<output> board does not match the played move")
+    return errors
+
+
+def validate_trace(text):
+    """Errors of one trace text, fast enough to check samples as they are generated."""
+    try:
+        return validate_record(parse_trace(text))
+    except Exception as e:  # lines the parser cannot read, e.g. a broken score
+        return [f"parse error: {e!r}"]
+
+
+def _validate_chunk(lines):
+    results = []
+    for line in lines:
+        try:
+            text = json.loads(line)["text"]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            results.append([f"bad JSON line: {e!r}"])
+            continue
+        results.append(validate_trace(text))
+    return results
+
+
+def _chunks(paths, chunk_size):
+    for file_idx, path in enumerate(paths):
+        chunk, start = [], 0
+        for idx, line in enumerate(iter_jsonl(path)):
+            chunk.append(line)
+            if len(chunk) == chunk_size:
+                yield file_idx, start, chunk
+                chunk, start = [], idx + 1
+        if chunk:
+            yield file_idx, start, chunk
+
+
+def validate_jsonl(paths, quarantine_path=None, num_workers=None, chunk_size=256, report_path=None, max_examples=20):
+    """
+    Check every sample of the JSONL outputs (plain or block-compressed) with `validate_trace` on a process pool.
+    Bad samples go to `quarantine_path` as {"file", "line", "errors", "text"} lines.
+    Returns the report: sample and bad counts, in total and per file, and how often every kind of error occurred.
+    """
+    samples = [0] * len(paths)
+    bad = [0] * len(paths)
+    kinds = {}
+    examples = []
+    quarantine = open(quarantine_path, "w", encoding="utf-8") if quarantine_path else None
+    try:
+        with mp.Pool(num_workers) as pool:
+            chunks = _chunks(paths, chunk_size)
+            # lines are read here and validated in the workers, at most 4 chunks per worker in flight, collected in order
+            pending = ((file_idx, start, chunk, pool.apply_async(_validate_chunk, (chunk,))) for file_idx, start, chunk in chunks)
+            window = []
+            for item in pending:
+                window.append(item)
+                if len(window) < 4 * (num_workers or os.cpu_count()):
+                    continue
+                _collect(window.pop(0), paths, samples, bad, kinds, examples, quarantine, max_examples)
+            for item in window:
+                _collect(item, paths, samples, bad, kinds, examples, quarantine, max_examples)
+    finally:
+        if quarantine is not None:
+            quarantine.close()
+
+    report = {
+        "samples": sum(samples),
+        "bad": sum(bad),
+        "bad_rate": sum(bad) / sum(samples) if sum(samples) else 0.0,
+        "errors": dict(sorted(kinds.items(), key=lambda x: -x[1])),
+        "examples": examples,
+        "files": {path: {"samples": n, "bad": b} for path, n, b in zip(paths, samples, bad)},
+    }
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def _collect(item, paths, samples, bad, kinds, examples, quarantine, max_examples):
+    file_idx, start, chunk, result = item
+    for offset, errors in enumerate(result.get()):
+        samples[file_idx] += 1
+        if not errors:
+            continue
+        bad[file_idx] += 1
+        for error in errors:
+            kind = error.split(":")[0]  # messages are "<kind>: <details>"
+            kinds[kind] = kinds.get(kind, 0) + 1
+        if len(examples) < max_examples:
+            examples.append({"file": paths[file_idx], "line": start + offset, "errors": errors})
+        if quarantine is not None:
+            try:
+                text = json.loads(chunk[offset])["text"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                text = chunk[offset]
+            entry = {"file": paths[file_idx], "line": start + offset, "errors": errors, "text": text}
+            quarantine.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    import glob
+    import time
+
+    JSONL_PATHS = sorted(glob.glob("data/*.jsonl") + glob.glob("data/*.jsonl.gz") + glob.glob("data/*.jsonl.xz"))
+    QUARANTINE_PATH = "data/quarantine.jsonl"
+
+    t0 = time.time()
+    report = validate_jsonl(JSONL_PATHS, QUARANTINE_PATH, report_path="data/validation_report.json")
+    elapsed = time.time() - t0
+    print(f"{report['samples']} samples in {elapsed:.1f}s ({report['samples'] / max(elapsed, 1e-9):.0f}/s), {report['bad']} bad.")
+    for kind, count in report["errors"].items():
+        print(f"{count:8d}  {kind}")